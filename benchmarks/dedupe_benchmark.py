@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from build_results import BuildResultsService
+from config import JobGroupReportingConfig
+from result_records import BuildResult, FailureLink, TestCaseResult
+from utils import CommandArgumentsParser, Logger
+
+# Times the latest-status-per-test-case dedupe in BuildResultsService for growing suite sizes. Time per folded case
+# should stay roughly flat as the suite grows; the old list-scanning version is timed alongside for comparison.
+DEFAULT_BUILDS = 30
+DEFAULT_CASE_COUNTS = [1000, 2000, 4000, 8000]
+LEGACY_CASE_LIMIT = 2000
+
+def synthetic_builds(number_of_builds, number_of_cases):
+	builds = []
+	for build_number in range(1, number_of_builds + 1):
+		build = BuildResult(build_number)
+		for index in range(0, number_of_cases):
+			is_passing = ((index + build_number) % 7 != 0)
+			failure_link = None if is_passing else FailureLink('case_' + str(index), None, 'http://jenkins/', 'suite/test_file/')
+			build.test_cases.append(TestCaseResult('test_nav1_1_navigation_case_' + str(index), is_passing, failure_link,
+				build_number))
+		builds.append(build)
+	return builds
+
+def legacy_fold(tests, new_results):
+	for case in new_results.test_cases:
+		case_name = case.case_name
+		if case_name in [test['case_name'] for test in tests]:
+			tests = list(filter(lambda test: test['case_name'] != case_name, tests))
+		tests.append({ 'case_name': case_name, 'is_passing': case.is_passing, 'failure_link': case.failure_link })
+	return tests
+
+def time_fold(service, builds):
+	start = time.perf_counter()
+	tests = {}
+	for new_results in builds:
+		service.fold_test_cases(tests, new_results)
+	return time.perf_counter() - start
+
+def time_legacy_fold(builds):
+	start = time.perf_counter()
+	tests = []
+	for new_results in builds:
+		tests = legacy_fold(tests, new_results)
+	return time.perf_counter() - start
+
+def main():
+	number_of_builds = CommandArgumentsParser.get_argument('builds', 'b')
+	number_of_builds = int(number_of_builds) if number_of_builds and number_of_builds is not True else DEFAULT_BUILDS
+	job_config = JobGroupReportingConfig('Benchmark', 'Benchmark', -1, '_nav[0-9]+_[0-9]+_navigation_')
+	service = BuildResultsService(job_config, Logger())
+
+	print('builds  cases   keyed (s)  us/case  legacy (s)')
+	for number_of_cases in DEFAULT_CASE_COUNTS:
+		builds = synthetic_builds(number_of_builds, number_of_cases)
+		keyed_seconds = time_fold(service, builds)
+		per_case = keyed_seconds * 1000000.0 / (number_of_builds * number_of_cases)
+		legacy = '%10.3f' % time_legacy_fold(builds) if number_of_cases <= LEGACY_CASE_LIMIT else '%10s' % '-'
+		print('%6d  %6d  %9.3f  %7.2f  %s' % (number_of_builds, number_of_cases, keyed_seconds, per_case, legacy))
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,102 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from build_results import BuildResultsService, JenkinsClient
+from config import JobReportingConfigManager
+from http_pool import HttpConnectionPool
+from jenkins_fixtures import SyntheticJenkinsFixture
+from report_snapshot import ReportSnapshot
+from stub_jenkins import StubJenkinsServer
+from utils import CommandArgumentsParser, Logger
+
+# Checks that an --incremental report equals a full re-scrape. A snapshot is taken with the first number of builds,
+# more builds are added, and the report is composed again from the snapshot and from scratch; every sheet (counts,
+# failure links and their order, flaky test statistics) must come out the same. Runs with and without a rerun job,
+# and again with the next-to-last build of the snapshot still running when it is taken, finishing before the next run.
+#
+#   python benchmarks/incremental_check.py --builds=12 --new-builds=3 --window=9
+
+def compose_sheets(config_manager, snapshot=None):
+	logger = Logger()
+	sheets = []
+	for job_config in config_manager.rerun_job_configs:
+		service = BuildResultsService(job_config, logger, snapshot)
+		sheets.append((job_config.sheet_title, sorted(service.compose_rerun_regression_results(), key=lambda k: k['app_title'])))
+	for group_config in config_manager.job_group_configs:
+		group_results = []
+		for app_title in group_config.job_application_mappings:
+			service = BuildResultsService(group_config.config_for(app_title), logger, snapshot)
+			group_results.append(service.compose_single_job_regression_results(app_title))
+		sheets.append((group_config.sheet_title, group_results))
+	return sheets
+
+def comparable_rows(sheets):
+	rows = []
+	for sheet_title, results in sheets:
+		for result in results:
+			rows.append((sheet_title, result['app_title'], result['number_passing'], result['number_failing'],
+				[(link.value, link.url) for link in (result['failure_links'] or [])]))
+			rows += [(sheet_title, result['app_title'], stats.case_name, stats.runs, stats.passes, stats.flips, stats.failure_streak,
+				stats.longest_failure_streak, stats.failure_link.url if stats.failure_link else None)
+				for stats in result.get('flaky_tests', [])]
+	return rows
+
+def check(fixture, base_url, work_directory, number_of_builds, new_builds, window, is_rerun_defined, is_running):
+	config_filename = os.path.join(work_directory, 'config.xml')
+	with open(config_filename, 'w') as file:
+		file.write(fixture.config_xml(base_url, window, is_rerun_defined))
+	config_manager = JobReportingConfigManager(config_filename)
+	config_manager.read_config_from_file()
+	snapshot_filename = os.path.join(work_directory, 'snapshot_' + str(is_rerun_defined) + '_' + str(is_running) + '.json')
+
+	fixture.number_of_builds = number_of_builds
+	fixture.running_builds = [number_of_builds - 1] if is_running else []
+	snapshot = ReportSnapshot(snapshot_filename)
+	compose_sheets(config_manager, snapshot)
+	snapshot.save()
+
+	fixture.number_of_builds = number_of_builds + new_builds
+	fixture.running_builds = []
+	snapshot = ReportSnapshot(snapshot_filename)
+	snapshot.load()
+	incremental_rows = comparable_rows(compose_sheets(config_manager, snapshot))
+	full_rows = comparable_rows(compose_sheets(config_manager))
+
+	differences = [(incremental, full) for incremental, full in zip(incremental_rows, full_rows) if incremental != full]
+	if len(incremental_rows) != len(full_rows):
+		differences.append(('rows', len(incremental_rows), len(full_rows)))
+	print(('with' if is_rerun_defined else 'without') + ' rerun job' + (', build ' + str(number_of_builds - 1) + ' running' if is_running
+		else '') + ': ' + str(len(full_rows)) + ' row(s), ' +
+		str(len(differences)) + ' difference(s)')
+	for difference in differences[:5]:
+		print('  ' + repr(difference)[:300])
+	return not differences
+
+def argument(argument_name, short_name, default):
+	value = CommandArgumentsParser.get_argument(argument_name, short_name)
+	return int(value) if value is not None and value is not True else default
+
+def main():
+	number_of_builds = argument('builds', 'b', 12)
+	new_builds = argument('new-builds', 'n', 3)
+	window = argument('window', 'w', 9)
+	fixture = SyntheticJenkinsFixture(cases_per_build=argument('cases', 'c', 200), failure_rate=0.2, apps_per_job=4,
+		group_jobs=2)
+	stub = StubJenkinsServer(documents=fixture).start()
+	JenkinsClient.cache = None
+	JenkinsClient.connection_pool = HttpConnectionPool()
+	work_directory = tempfile.mkdtemp(prefix='incremental_check_')
+	try:
+		is_equal = all([check(fixture, stub.base_url, work_directory, number_of_builds, new_builds, window, is_rerun_defined, is_running)
+			for is_running in [False, True] for is_rerun_defined in [True, False]])
+	finally:
+		JenkinsClient.connection_pool.close()
+		stub.stop()
+	print('Incremental report ' + ('matches' if is_equal else 'DIFFERS FROM') + ' a full re-scrape')
+	sys.exit(0 if is_equal else 1)
+
+if __name__ == '__main__':
+	main()
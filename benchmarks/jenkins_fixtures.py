@@ -0,0 +1,138 @@
+import random
+from xml.sax.saxutils import escape
+
+# Generates deterministic Jenkins /api/json and /testReport/api/json documents on demand, so that large suites and
+# long histories can be served by the stub server without holding every document in memory. One rerun job (with
+# its rerun job) exercises ApplicationNameParser and a group of jobs exercises TestCaseNamesParser.
+class SyntheticJenkinsFixture:
+	VIEW_NAME = 'Benchmark Regression'
+	JOB_NAME = 'Benchmark Regression Build'
+	RERUN_NAME = 'Benchmark Regression Rerun'
+	GROUP_VIEW_NAME = 'Benchmark Navigation'
+	GROUP_JOB_PREFIX = 'navigation benchmark '
+	CLASSNAME_PREFIX = 'com.example.regression.suite.module.tests.app'
+	APPLICATION_CLASSNAME_INDEX = 7
+	TEST_FILENAME_INDEX = 8
+	TEST_NAME_DELIMITER = '_nav[0-9]+_[0-9]+_navigation_'
+	FILES_PER_APPLICATION = 20
+	RERUN_CASE_FRACTION = 0.1
+
+	def __init__(self, cases_per_build=1000, failure_rate=0.05, number_of_builds=30, apps_per_job=10, group_jobs=3,
+		suites_per_build=1, seed=0):
+		self.cases_per_build = cases_per_build
+		self.failure_rate = failure_rate
+		self.number_of_builds = number_of_builds
+		self.apps_per_job = apps_per_job
+		self.group_jobs = group_jobs
+		self.suites_per_build = suites_per_build
+		self.seed = seed
+		# Builds listed as still running, in every job.
+		self.running_builds = []
+
+	def jobs(self):
+		jobs = [(SyntheticJenkinsFixture.VIEW_NAME, SyntheticJenkinsFixture.JOB_NAME),
+			(SyntheticJenkinsFixture.VIEW_NAME, SyntheticJenkinsFixture.RERUN_NAME)]
+		return jobs + [(SyntheticJenkinsFixture.GROUP_VIEW_NAME, self.group_job_name(index)) for index in range(0, self.group_jobs)]
+
+	def group_job_name(self, index):
+		return SyntheticJenkinsFixture.GROUP_JOB_PREFIX + str(index)
+
+	def application_key(self, index):
+		return 'application_' + str(index)
+
+	def build_numbers(self, view_name, job_name):
+		if (view_name, job_name) not in self.jobs():
+			return []
+		return range(1, self.number_of_builds + 1)
+
+	def document(self, view_name, job_name, build_number, is_test_report):
+		if is_test_report:
+			return self.test_report_document(view_name, job_name, build_number)
+		return self.build_document(view_name, job_name, build_number)
+
+	def build_document(self, view_name, job_name, build_number):
+		parameters = [{ 'name': 'BRANCH', 'value': 'master' }]
+		if view_name == SyntheticJenkinsFixture.VIEW_NAME:
+			parameters.append({ 'name': 'APPLICATION', 'value': self._application_for(build_number) })
+		return {
+			'id': str(build_number),
+			'number': build_number,
+			'building': build_number in self.running_builds,
+			'result': None if build_number in self.running_builds else 'SUCCESS',
+			'timestamp': 1500000000000 + build_number * 3600000,
+			'actions': [{ 'causes': [{ 'shortDescription': 'Started by timer' }] }, { 'parameters': parameters }]
+		}
+
+	def test_report_document(self, view_name, job_name, build_number):
+		generator = random.Random(str(self.seed) + '/' + job_name + '/' + str(build_number))
+		cases = []
+		if view_name == SyntheticJenkinsFixture.VIEW_NAME:
+			application = self._application_for(build_number)
+			number_of_cases = self.cases_per_build
+			if job_name == SyntheticJenkinsFixture.RERUN_NAME:
+				number_of_cases = max(1, int(number_of_cases * SyntheticJenkinsFixture.RERUN_CASE_FRACTION))
+			for index in range(0, number_of_cases):
+				class_name = (SyntheticJenkinsFixture.CLASSNAME_PREFIX + '.test_' + application + '.test_file_' +
+					str(index % SyntheticJenkinsFixture.FILES_PER_APPLICATION))
+				cases.append(self._case(generator, class_name, 'test_case_' + str(index)))
+		else:
+			for index in range(0, self.cases_per_build):
+				class_name = (SyntheticJenkinsFixture.CLASSNAME_PREFIX + '.navigation.test_navigation_' +
+					str(index % SyntheticJenkinsFixture.FILES_PER_APPLICATION))
+				cases.append(self._case(generator, class_name, 'test_nav1_1_navigation_case_' + str(index)))
+
+		fail_count = len([case for case in cases if case['status'] in ['FAILED', 'REGRESSION']])
+		suite_size = max(1, -(-len(cases) // self.suites_per_build))
+		suites = [{ 'name': 'suite_' + str(index), 'duration': 1.0, 'cases': cases[index * suite_size:(index + 1) * suite_size] }
+			for index in range(0, self.suites_per_build)]
+		return { 'duration': 1.0, 'empty': False, 'failCount': fail_count, 'passCount': len(cases) - fail_count,
+			'skipCount': 0, 'suites': suites }
+
+	def config_xml(self, base_url, build_history_reporting_length=None, is_rerun_defined=True):
+		history_length = build_history_reporting_length or (self.number_of_builds - 1)
+		mappings = ''.join('\t\t\t<mapping app_key="' + self.application_key(index) + '" title="Application ' + str(index) + '" />\n'
+			for index in range(0, self.apps_per_job))
+		group_jobs = ''.join('\t\t<job_config>\n\t\t\t<app_title>' + escape(self.group_job_name(index)) + '</app_title>\n\t\t\t<job_name>' +
+			escape(self.group_job_name(index)) + '</job_name>\n\t\t</job_config>\n' for index in range(0, self.group_jobs))
+		return ('<reporting_config>\n'
+			'\t<base_url>' + escape(base_url) + '</base_url>\n'
+			'\t<build_history_reporting_length>' + str(history_length) + '</build_history_reporting_length>\n'
+			'\t<percentage_formatting>\n'
+			'\t\t<format type="success">\n\t\t\t<font_color>006100</font_color>\n\t\t\t<fill_color>C6EFCE</fill_color>\n'
+			'\t\t\t<range operator="greaterThan" value="0.9949999" />\n\t\t</format>\n'
+			'\t\t<format type="unstable">\n\t\t\t<font_color>9C6500</font_color>\n\t\t\t<fill_color>FFEB9C</fill_color>\n'
+			'\t\t\t<range operator="between">\n\t\t\t\t<min>0.75</min>\n\t\t\t\t<max>0.9949999</max>\n\t\t\t</range>\n\t\t</format>\n'
+			'\t\t<format type="failure">\n\t\t\t<font_color>9C0006</font_color>\n\t\t\t<fill_color>FFC7CE</fill_color>\n'
+			'\t\t\t<range operator="lessThan" value="0.75" />\n\t\t</format>\n'
+			'\t</percentage_formatting>\n'
+			'\t<job_config>\n'
+			'\t\t<view_name>' + SyntheticJenkinsFixture.VIEW_NAME + '</view_name>\n'
+			'\t\t<job_name>' + SyntheticJenkinsFixture.JOB_NAME + '</job_name>\n' +
+			('\t\t<rerun_name>' + SyntheticJenkinsFixture.RERUN_NAME + '</rerun_name>\n' if is_rerun_defined else '') +
+			'\t\t<classname_index>' + str(SyntheticJenkinsFixture.APPLICATION_CLASSNAME_INDEX) + '</classname_index>\n'
+			'\t\t<test_filename_index>' + str(SyntheticJenkinsFixture.TEST_FILENAME_INDEX) + '</test_filename_index>\n'
+			'\t\t<application_delimiter>test_</application_delimiter>\n'
+			'\t\t<sheet_title>Benchmark Regression</sheet_title>\n'
+			'\t\t<results_parser>ApplicationNameParser</results_parser>\n'
+			'\t\t<app_title_mappings>\n' + mappings + '\t\t</app_title_mappings>\n'
+			'\t</job_config>\n'
+			'\t<job_config_group view_name="' + SyntheticJenkinsFixture.GROUP_VIEW_NAME + '">\n'
+			'\t\t<test_filename_index>' + str(SyntheticJenkinsFixture.TEST_FILENAME_INDEX) + '</test_filename_index>\n'
+			'\t\t<test_name_delimiter>' + SyntheticJenkinsFixture.TEST_NAME_DELIMITER + '</test_name_delimiter>\n'
+			'\t\t<results_parser>TestCaseNamesParser</results_parser>\n'
+			'\t\t<sheet_title>Benchmark Navigation</sheet_title>\n' + group_jobs +
+			'\t</job_config_group>\n'
+			'</reporting_config>\n')
+
+	def _application_for(self, build_number):
+		return self.application_key(build_number % self.apps_per_job)
+
+	def _case(self, generator, class_name, name):
+		roll = generator.random()
+		if roll < self.failure_rate:
+			status = 'REGRESSION' if roll < self.failure_rate / 4 else 'FAILED'
+		else:
+			status = 'FIXED' if roll < self.failure_rate * 1.5 else 'PASSED'
+		return { 'className': class_name, 'name': name, 'status': status, 'duration': 0.1, 'skipped': False,
+			'errorDetails': ('Assertion failed in ' + name) if status in ['FAILED', 'REGRESSION'] else None,
+			'stdout': 'Running ' + name + '\n' * 3, 'stderr': None }
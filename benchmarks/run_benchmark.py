@@ -0,0 +1,266 @@
+import contextlib
+import gc
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from openpyxl import Workbook
+
+from build_results import BuildResultsService, JenkinsClient
+from config import JobReportingConfigManager
+from excel_reporting import WorkbookManager
+from http_pool import HttpConnectionPool
+from jenkins_fixtures import SyntheticJenkinsFixture
+from result_records import BuildResult
+from stub_jenkins import StubJenkinsServer
+from utils import CommandArgumentsParser, Logger
+
+# End-to-end benchmark of the scraper against a stub Jenkins serving synthetic builds. The stub runs in its own
+# process so that its documents do not count towards the scraper's memory. Each stage is timed on its own (fetch,
+# parser chain, aggregation, workbook write and save) and then the whole pipeline is timed in one go. Startup (importing
+# the reporter and reading its config) is timed in a fresh interpreter, since this process has already imported everything.
+# Memory comes from a second pass under tracemalloc, which would slow down the timed one: for each stage, the most it had
+# allocated at any point (peak) and what it still held at its end (retained), both on top of what was held when it began.
+#
+#   python benchmarks/run_benchmark.py --cases=5000 --builds=30 --failure-rate=0.05 --output-filename=before.json
+
+STARTUP_SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+import regression_results_reporter
+from config import JobReportingConfigManager
+JobReportingConfigManager(sys.argv[1]).read_config_from_file()
+print(json.dumps({ 'wall_time': round(time.perf_counter() - start, 4), 'modules': len(sys.modules),
+	'is_openpyxl_loaded': 'openpyxl' in sys.modules }))
+'''
+STARTUP_REPEATS = 5
+BYTES_PER_MB = 1024.0 * 1024.0
+
+def serve_fixture(fixture, latency, connection):
+	stub = StubJenkinsServer(latency=latency, documents=fixture)
+	connection.send(stub.base_url)
+	stub.start()._thread.join()
+
+class PreparsedResultsService(BuildResultsService):
+	# Runs the real aggregation code over results that were already fetched and parsed, keeping the network and the
+	# parsers out of the aggregation timings.
+	def __init__(self, job_config, logger, parsed_results):
+		super(PreparsedResultsService, self).__init__(job_config, logger)
+		self.parsed_results = parsed_results
+
+	def construct_build_number_range(self, is_rerun=False):
+		build_number_range = []
+		if (not is_rerun) or self.job_config.is_rerun_defined():
+			job = self.job_config.job(is_rerun)
+			build_number_range = sorted(number for (job_name, number) in self.parsed_results if job_name == job)
+		return build_number_range
+
+	def fetch_build_results(self, build_number_range, is_rerun=False):
+		job = self.job_config.job(is_rerun)
+		for number in build_number_range:
+			yield self.parsed_results[(job, number)]
+
+class BenchmarkRun:
+	def __init__(self, fixture, base_url, max_fetch_workers=None, is_write_only=False):
+		self.fixture = fixture
+		self.base_url = base_url
+		self.max_fetch_workers = max_fetch_workers
+		self.is_write_only = is_write_only
+		self.logger = Logger()
+		self.stages = []
+		self.work_directory = tempfile.mkdtemp(prefix='regression_benchmark_')
+		self.config_filename = os.path.join(self.work_directory, 'benchmark_config.xml')
+		with open(self.config_filename, 'w') as file:
+			file.write(fixture.config_xml(base_url))
+		self.config_manager = JobReportingConfigManager(self.config_filename, max_fetch_workers)
+		self.config_manager.read_config_from_file()
+
+	@contextlib.contextmanager
+	def stage(self, name):
+		if tracemalloc.is_tracing():
+			# Earlier stages leave cycles behind (workbooks are full of them), which must not be freed during this one.
+			gc.collect()
+			tracemalloc.reset_peak()
+			traced_before = tracemalloc.get_traced_memory()[0]
+			with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+				yield
+			traced, traced_peak = tracemalloc.get_traced_memory()
+			stage = next(stage for stage in self.stages if stage['stage'] == name)
+			stage['peak_mb'] = round((traced_peak - traced_before) / BYTES_PER_MB, 1)
+			stage['retained_mb'] = round((traced - traced_before) / BYTES_PER_MB, 1)
+			return
+
+		pool = JenkinsClient.connection_pool
+		requests_before = self.stub_request_count()
+		opened_before = pool.connections_opened
+		reused_before = pool.connections_reused
+		start = time.perf_counter()
+		with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+			yield
+		wall_time = time.perf_counter() - start
+		self.stages.append({
+			'stage': name,
+			'wall_time': round(wall_time, 4),
+			'requests': self.stub_request_count() - requests_before,
+			'connections_opened': pool.connections_opened - opened_before,
+			'connections_reused': pool.connections_reused - reused_before
+		})
+
+	def measure_startup(self):
+		# Best of STARTUP_REPEATS fresh interpreters.
+		package_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+		runs = []
+		for repeat in range(0, STARTUP_REPEATS):
+			output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT, self.config_filename], cwd=package_directory,
+				capture_output=True, text=True, check=True).stdout
+			runs.append(json.loads(output.splitlines()[-1]))
+		return min(runs, key=lambda run: run['wall_time'])
+
+	def stub_request_count(self):
+		with urllib.request.urlopen(self.base_url + StubJenkinsServer.STATS_PATH) as response:
+			return json.loads(response.read().decode('utf-8'))['request_count']
+
+	def job_configs(self):
+		job_configs = list(self.config_manager.rerun_job_configs)
+		for group_config in self.config_manager.job_group_configs:
+			job_configs += [group_config.config_for(app_title) for app_title in group_config.job_application_mappings]
+		return job_configs
+
+	def run(self):
+		self.run_stages()
+		tracemalloc.start()
+		try:
+			self.run_stages()
+		finally:
+			tracemalloc.stop()
+		return self.stages
+
+	def run_stages(self):
+		JenkinsClient.cache = None
+		JenkinsClient.connection_pool = HttpConnectionPool()
+		job_configs = self.job_configs()
+
+		documents = {}
+		with self.stage('fetch'):
+			for job_config in job_configs:
+				for is_rerun in ([False, True] if job_config.is_rerun_defined() else [False]):
+					job = job_config.job(is_rerun)
+					for number in self.fixture.build_numbers(job_config.view_name, job):
+						test_report = JenkinsClient.json_response_from_request(job_config.base_url, job_config.view_name, job, number, True,
+							JenkinsClient.test_report_tree(job_config.results_parsers))
+						build = JenkinsClient.json_response_from_request(job_config.base_url, job_config.view_name, job, number,
+							tree=JenkinsClient.build_tree(job_config.results_parsers))
+						documents[(job_config, job, number)] = (test_report, build)
+
+		parsed_results = {}
+		with self.stage('parse'):
+			for (job_config, job, number), (test_report, build) in documents.items():
+				result = BuildResult(number)
+				result = JenkinsClient.parse_test_report(job_config, test_report, job, number, result)
+				for parser in job_config.results_parsers:
+					if callable(getattr(parser, 'apply_application_title', None)):
+						result = parser.apply_application_title(job_config, build, result)
+				parsed_results.setdefault(job_config, {})[(job, number)] = result
+		documents = test_report = build = result = None
+
+		sheets = []
+		with self.stage('aggregate'):
+			for job_config in self.config_manager.rerun_job_configs:
+				service = PreparsedResultsService(job_config, self.logger, parsed_results[job_config])
+				sheets.append((job_config.sheet_title, service.compose_rerun_regression_results()))
+			for job_config in job_configs[len(self.config_manager.rerun_job_configs):]:
+				service = PreparsedResultsService(job_config, self.logger, parsed_results[job_config])
+				sheets.append((job_config.job_name, [service.compose_single_job_regression_results(job_config.job_name)]))
+		parsed_results = service = None
+
+		with self.stage('workbook_write'):
+			excel_manager = self.write_workbook(sheets)
+		with self.stage('workbook_save'):
+			excel_manager.workbook.save(os.path.join(self.work_directory, 'stages.xlsx'))
+		sheets = excel_manager = None
+
+		JenkinsClient.connection_pool = HttpConnectionPool()
+		with self.stage('end_to_end'):
+			sheets = []
+			for job_config in self.config_manager.rerun_job_configs:
+				service = BuildResultsService(job_config, self.logger)
+				sheets.append((job_config.sheet_title, service.compose_rerun_regression_results()))
+			for group_config in self.config_manager.job_group_configs:
+				group_results = []
+				for app_title in group_config.job_application_mappings:
+					service = BuildResultsService(group_config.config_for(app_title), self.logger)
+					group_results.append(service.compose_single_job_regression_results(app_title))
+				sheets.append((group_config.sheet_title, group_results))
+			excel_manager = self.write_workbook(sheets)
+			excel_manager.workbook.save(os.path.join(self.work_directory, 'end_to_end.xlsx'))
+
+	def write_workbook(self, sheets):
+		excel_manager = WorkbookManager(Workbook(write_only=self.is_write_only), self.config_manager.percentage_formatting)
+		overall_results = []
+		for index, (sheet_title, results) in enumerate(sheets):
+			excel_manager.write_results_to_worksheet(sorted(results, key=lambda k: k['app_title']), sheet_title, index > 0)
+			overall_results.append({
+				'app_title': sheet_title,
+				'number_passing': sum(result['number_passing'] for result in results),
+				'number_failing': sum(result['number_failing'] for result in results),
+				'failure_links': None
+			})
+		excel_manager.write_results_to_worksheet(overall_results, 'Regression Results', True, table_name='Module',
+			table_title='Overall Automated Regression Results', is_failures_reported=False, is_main_sheet=True)
+		return excel_manager
+
+def argument(argument_name, short_name, default, value_type):
+	value = CommandArgumentsParser.get_argument(argument_name, short_name)
+	return value_type(value) if value is not None and value is not True else default
+
+def main():
+	fixture = SyntheticJenkinsFixture(
+		cases_per_build=argument('cases', 'c', 1000, int),
+		failure_rate=argument('failure-rate', 'f', 0.05, float),
+		number_of_builds=argument('builds', 'b', 30, int),
+		apps_per_job=argument('apps', 'a', 10, int),
+		group_jobs=argument('group-jobs', 'g', 3, int),
+		suites_per_build=argument('suites', 's', 1, int),
+		seed=argument('seed', 'r', 0, int))
+	latency = argument('latency', 'l', 0.0, float)
+	max_fetch_workers = argument('workers', 'w', None, int)
+	output_filename = argument('output-filename', 'o', None, str)
+	JenkinsClient.is_streaming = bool(CommandArgumentsParser.get_argument('stream-json', 'j'))
+	is_write_only = bool(CommandArgumentsParser.get_argument('write-only', 'e'))
+
+	parent_connection, child_connection = multiprocessing.Pipe()
+	stub_process = multiprocessing.Process(target=serve_fixture, args=(fixture, latency, child_connection))
+	stub_process.daemon = True
+	stub_process.start()
+	try:
+		base_url = parent_connection.recv()
+		benchmark_run = BenchmarkRun(fixture, base_url, max_fetch_workers, is_write_only)
+		startup = benchmark_run.measure_startup()
+		stages = benchmark_run.run()
+	finally:
+		stub_process.terminate()
+
+	print('startup %.3f s, %d modules, openpyxl %s' % (startup['wall_time'], startup['modules'],
+		'loaded' if startup['is_openpyxl_loaded'] else 'not loaded'))
+	print('%-16s %10s %8s %12s %9s %8s %8s' % ('stage', 'wall (s)', 'peak MB', 'retained MB', 'requests', 'opened', 'reused'))
+	for stage in stages:
+		print('%-16s %10.3f %8.1f %12.1f %9d %8d %8d' % (stage['stage'], stage['wall_time'], stage['peak_mb'], stage['retained_mb'],
+			stage['requests'], stage['connections_opened'], stage['connections_reused']))
+	if output_filename:
+		summary = { 'parameters': vars(fixture), 'latency': latency, 'max_fetch_workers': max_fetch_workers,
+			'is_streaming': JenkinsClient.is_streaming, 'is_write_only': is_write_only, 'startup': startup,
+			'stages': stages }
+		with open(output_filename, 'w') as file:
+			json.dump(summary, file, indent=2)
+		print('Wrote benchmark summary to \'' + output_filename + '\'')
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,67 @@
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from result_records import BuildResult, FailureLink, TestCaseResult
+from results_store import ResultsStore
+from utils import CommandArgumentsParser
+
+# Fills a results store with a long synthetic history and times the queries dashboards run against it: the last
+# statuses of one test, pass rates per app and the latest failures of one app.
+DEFAULT_BUILDS = 90
+DEFAULT_CASES = 5000
+JOBS = ['navigation GL PY', 'navigation PD', 'BO1110R']
+QUERY_REPEATS = 100
+
+class BenchmarkJobConfig:
+	view_name = 'Benchmark'
+
+def synthetic_build(job, build_number, number_of_builds, number_of_cases):
+	result = BuildResult(build_number)
+	result.app_title = job
+	# One build a day, the newest today, so the 90-day pass rates cover part of a longer history.
+	result.timestamp = int((time.time() - (number_of_builds - build_number) * 24 * 60 * 60) * 1000)
+	url_prefix = 'http://jenkins/view/Benchmark/job/' + job + '/' + str(build_number) + '/testReport/junit/'
+	for index in range(0, number_of_cases):
+		is_passing = ((index + build_number) % 7 != 0)
+		failure_link = None if is_passing else FailureLink('test_case_' + str(index), None, url_prefix, 'suite/file' + str(index % 40) + '/')
+		result.test_cases.append(TestCaseResult('test_case_' + str(index), is_passing, failure_link, build_number))
+	result.number_passing = sum(1 for case in result.test_cases if case.is_passing)
+	result.number_failing = number_of_cases - result.number_passing
+	return result
+
+def time_query(query, *args):
+	start = time.perf_counter()
+	for repeat in range(0, QUERY_REPEATS):
+		query(*args)
+	return (time.perf_counter() - start) / QUERY_REPEATS * 1000
+
+def main():
+	number_of_builds = CommandArgumentsParser.get_argument('builds', 'b')
+	number_of_builds = int(number_of_builds) if number_of_builds and number_of_builds is not True else DEFAULT_BUILDS
+	number_of_cases = CommandArgumentsParser.get_argument('cases', 'c')
+	number_of_cases = int(number_of_cases) if number_of_cases and number_of_cases is not True else DEFAULT_CASES
+
+	store = ResultsStore(os.path.join(tempfile.mkdtemp(prefix='store_benchmark_'), 'results_store.sqlite'))
+	store.open()
+	start = time.perf_counter()
+	for job in JOBS:
+		for build_number in range(1, number_of_builds + 1):
+			store.add_build(BenchmarkJobConfig, job, synthetic_build(job, build_number, number_of_builds, number_of_cases))
+	fill_seconds = time.perf_counter() - start
+
+	print('builds  cases/build  rows       fill (s)  size (MB)')
+	print('%6d  %11d  %9d  %8.2f  %9.1f' % (number_of_builds, number_of_cases, len(JOBS) * number_of_builds * number_of_cases,
+		fill_seconds, os.path.getsize(store.filename) / (1024 * 1024.0)))
+	print('')
+	print('query                          ms/query')
+	print('%-29s  %8.3f' % ('last 10 statuses of a test', time_query(store.case_history, JOBS[0], 'test_case_42', 10)))
+	print('%-29s  %8.3f' % ('pass rate per app, 90 days', time_query(store.app_pass_rates, 90)))
+	print('%-29s  %8.3f' % ('latest 100 failures of an app', time_query(store.app_failures, JOBS[1], JOBS[1], 100)))
+	store.close()
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,179 @@
+import gzip
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+# Minimal stand-in for the parts of the Jenkins JSON API the scraper uses. Each build is a pair of JSON documents
+# (the build itself and its test report) looked up from a document source and served from a local HTTP server.
+# The source is anything with build_numbers(view_name, job_name) and document(view_name, job_name, build_number,
+# is_test_report); StaticJenkinsDocuments is used when none is given.
+class StubJenkinsServer:
+	STATS_PATH = '/stub/stats'
+	# Jenkins' 'builds' job property is getBuilds().limit(100); only 'allBuilds' lists every build.
+	MAX_JOB_BUILDS = 100
+
+	def __init__(self, host='127.0.0.1', port=0, latency=0.0, documents=None):
+		self.latency = latency
+		self.documents = documents or StaticJenkinsDocuments()
+		self.request_count = 0
+		self._lock = threading.Lock()
+		self._server = ThreadingHTTPServer((host, port), self._handler_class())
+		self._server.daemon_threads = True
+		self._thread = None
+
+	@property
+	def base_url(self):
+		host, port = self._server.server_address[:2]
+		return 'http://' + host + ':' + str(port)
+
+	def add_build(self, view_name, job_name, build_number, build_data, test_report=None):
+		self.documents.add_build(view_name, job_name, build_number, build_data, test_report)
+
+	def start(self):
+		self._thread = threading.Thread(target=self._server.serve_forever)
+		self._thread.daemon = True
+		self._thread.start()
+		return self
+
+	def stop(self):
+		self._server.shutdown()
+		self._server.server_close()
+
+	def resolve(self, path):
+		data = self._resolve_document(path)
+		tree = parse_qs(urlparse(path).query).get('tree')
+		if data is not None and tree:
+			data = JenkinsTreeFilter(tree[0]).apply(data)
+		return data
+
+	def _resolve_document(self, path):
+		parts = [unquote(part) for part in urlparse(path).path.strip('/').split('/')]
+		if len(parts) < 6 or parts[0] != 'view' or parts[2] != 'job' or parts[-2:] != ['api', 'json']:
+			return None
+		build_numbers = self.documents.build_numbers(parts[1], parts[3])
+		if len(parts) == 6:
+			return self._job_document(parts[1], parts[3], build_numbers)
+		if not build_numbers:
+			return None
+		build_id = parts[4]
+		build_number = max(build_numbers) if build_id == 'lastBuild' else int(build_id)
+		if build_number not in build_numbers:
+			return None
+		return self.documents.document(parts[1], parts[3], build_number, parts[5] == 'testReport')
+
+	def _job_document(self, view_name, job_name, build_numbers):
+		builds = []
+		for build_number in sorted(build_numbers, reverse=True):
+			build = self.documents.document(view_name, job_name, build_number, False)
+			builds.append({ 'number': build_number, 'result': build.get('result'), 'building': build.get('building', False), 
+				'timestamp': build.get('timestamp') })
+		return { 'name': job_name, 'builds': builds[:StubJenkinsServer.MAX_JOB_BUILDS], 'allBuilds': builds }
+
+	def _count_request(self):
+		with self._lock:
+			self.request_count += 1
+
+	def _handler_class(self):
+		stub = self
+
+		class StubJenkinsRequestHandler(BaseHTTPRequestHandler):
+			protocol_version = 'HTTP/1.1'
+
+			def setup(self):
+				BaseHTTPRequestHandler.setup(self)
+				self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+			def do_GET(self):
+				if self.path == StubJenkinsServer.STATS_PATH:
+					self._send(200, json.dumps({ 'request_count': stub.request_count }).encode('utf-8'), 'application/json')
+					return
+				stub._count_request()
+				if stub.latency:
+					time.sleep(stub.latency)
+				data = stub.resolve(self.path)
+				if data is None:
+					self._send(404, b'Not Found', 'text/plain')
+				else:
+					self._send(200, json.dumps(data).encode('utf-8'), 'application/json',
+						'gzip' in self.headers.get('Accept-Encoding', ''))
+
+			def _send(self, status, body, content_type, is_gzipped=False):
+				if is_gzipped:
+					body = gzip.compress(body)
+				self.send_response(status)
+				self.send_header('Content-Type', content_type)
+				if is_gzipped:
+					self.send_header('Content-Encoding', 'gzip')
+				self.send_header('Content-Length', str(len(body)))
+				self.end_headers()
+				self.wfile.write(body)
+
+			def log_message(self, format, *args):
+				pass
+
+		return StubJenkinsRequestHandler
+
+class StaticJenkinsDocuments:
+	def __init__(self):
+		self.jobs = {}
+
+	def add_build(self, view_name, job_name, build_number, build_data, test_report=None):
+		builds = self.jobs.setdefault((view_name, job_name), {})
+		builds[int(build_number)] = { 'build': build_data, 'test_report': test_report }
+
+	def build_numbers(self, view_name, job_name):
+		return self.jobs.get((view_name, job_name), {})
+
+	def document(self, view_name, job_name, build_number, is_test_report):
+		return self.jobs[(view_name, job_name)][build_number]['test_report' if is_test_report else 'build']
+
+# Applies a Jenkins 'tree' query (e.g. 'passCount,suites[cases[name,status]]' or 'builds[number,result]{0,10}') to a
+# JSON document the same way the Jenkins remote API does.
+class JenkinsTreeFilter:
+	def __init__(self, tree):
+		self.fields, index = JenkinsTreeFilter._parse_fields(tree, 0)
+
+	def apply(self, data):
+		return JenkinsTreeFilter._filter(data, self.fields)
+
+	@staticmethod
+	def _filter(data, fields):
+		if isinstance(data, list):
+			return [JenkinsTreeFilter._filter(item, fields) for item in data]
+		if not isinstance(data, dict):
+			return data
+		filtered = {}
+		for name, sub_fields, item_range in fields:
+			if name in data:
+				value = data[name]
+				if item_range is not None and isinstance(value, list):
+					value = value[item_range[0]:item_range[1]]
+				filtered[name] = JenkinsTreeFilter._filter(value, sub_fields) if sub_fields else value
+		return filtered
+
+	@staticmethod
+	def _parse_fields(tree, index):
+		fields = []
+		while index < len(tree) and tree[index] != ']':
+			start = index
+			while index < len(tree) and tree[index] not in ',[]{':
+				index += 1
+			name = tree[start:index]
+			sub_fields = None
+			item_range = None
+			if index < len(tree) and tree[index] == '[':
+				sub_fields, index = JenkinsTreeFilter._parse_fields(tree, index + 1)
+				index += 1
+			if index < len(tree) and tree[index] == '{':
+				end = tree.index('}', index)
+				bounds = tree[index + 1:end].split(',')
+				lower = int(bounds[0] or 0)
+				item_range = (lower, int(bounds[1]) if len(bounds) > 1 and bounds[1] else (lower + 1 if len(bounds) == 1 else None))
+				index = end + 1
+			fields.append((name, sub_fields, item_range))
+			if index < len(tree) and tree[index] == ',':
+				index += 1
+		return fields, index
@@ -0,0 +1,77 @@
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from openpyxl import Workbook
+from openpyxl.styles import Font
+
+from excel_reporting import WorkbookManager, WorksheetManager
+from result_records import FailureLink
+from utils import CommandArgumentsParser
+
+# Times writing and saving one sheet with a long failure list, painted through the shared named styles and
+# through the old per-cell Font/PatternFill painter for comparison.
+DEFAULT_FAILURES = 10000
+PERCENTAGE_FORMATTING = {
+	'success': { 'font_color': '006100', 'fill_color': 'C6EFCE', 'range': { 'operator': 'greaterThan', 'value': ['0.9949999'] } },
+	'failure': { 'font_color': '9C0006', 'fill_color': 'FFC7CE', 'range': { 'operator': 'lessThan', 'value': ['0.75'] } }
+}
+
+class LegacyWorksheetManager(WorksheetManager):
+	def paint_cell(self, row, col, text, fill_color=None, is_bold=False, is_italic=False, is_underline=False,
+		font_size=12, border=None, is_percent=False, font_color='000000'):
+		cell_location = chr(col + 64) + str(row)
+		self.worksheet[cell_location] = text
+		if fill_color:
+			self.worksheet[cell_location].fill = WorksheetManager.fill_from_hex_value(fill_color)
+		if border:
+			self.worksheet[cell_location].border = border
+		if is_percent:
+			self.worksheet[cell_location].number_format = '0%'
+		underline_value = 'single' if is_underline else None
+		self.worksheet[cell_location].font = Font(bold=is_bold, italic=is_italic, underline=underline_value, size=font_size, color=font_color)
+
+	def paint_hyperlink(self, row, col, link, border=None, font_size=12):
+		cell_location = chr(col + 64) + str(row)
+		self.worksheet[cell_location] = link.value
+		self.worksheet[cell_location].hyperlink = link.url
+		self.worksheet[cell_location].font = Font(underline='single', color='0563C1', size=font_size)
+		if border:
+			self.worksheet[cell_location].border = border
+
+class LegacyWorkbookManager(WorkbookManager):
+	def _worksheet_manager(self, worksheet):
+		return LegacyWorksheetManager(worksheet)
+
+def synthetic_results(number_of_failures):
+	failure_links = [FailureLink('test_case_' + str(index), 'test_file_' + str(index % 20),
+		'http://jenkins/job/benchmark/1/testReport/junit/', 'suite/test_file/') for index in range(0, number_of_failures)]
+	return [{ 'app_title': 'Benchmark', 'number_passing': number_of_failures, 'number_failing': number_of_failures,
+		'failure_links': failure_links }]
+
+def time_workbook(manager_class, workbook, results, filename):
+	start = time.perf_counter()
+	excel_manager = manager_class(workbook, PERCENTAGE_FORMATTING)
+	excel_manager.write_results_to_worksheet(results, 'Benchmark')
+	write_seconds = time.perf_counter() - start
+	start = time.perf_counter()
+	excel_manager.workbook.save(filename)
+	return write_seconds, time.perf_counter() - start, os.path.getsize(filename)
+
+def main():
+	number_of_failures = CommandArgumentsParser.get_argument('failures', 'f')
+	number_of_failures = int(number_of_failures) if number_of_failures and number_of_failures is not True else DEFAULT_FAILURES
+	results = synthetic_results(number_of_failures)
+	filename = os.path.join(tempfile.mkdtemp(prefix='workbook_benchmark_'), 'benchmark.xlsx')
+
+	print('failures  painter     write (s)  save (s)  size (KB)')
+	for name, manager_class, is_write_only in [('legacy', LegacyWorkbookManager, False), ('named', WorkbookManager, False),
+			('write-only', WorkbookManager, True)]:
+		write_seconds, save_seconds, size = time_workbook(manager_class, Workbook(write_only=is_write_only), results, filename)
+		print('%8d  %-10s  %9.3f  %8.3f  %9d' % (number_of_failures, name, write_seconds, save_seconds, size / 1024))
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,193 @@
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+class BuildResultsCache:
+	DEFAULT_FILENAME = 'build_cache.sqlite'
+	DEFAULT_MAX_AGE_DAYS = 90
+	DEFAULT_MAX_SIZE_MB = 512
+	SECONDS_PER_DAY = 24 * 60 * 60
+	BYTES_PER_MB = 1024 * 1024
+	SCHEMA_VERSION = 2
+
+	def __init__(self, filename=None, max_age_days=None, max_size_mb=None, is_refreshing=False):
+		self.filename = filename or BuildResultsCache.DEFAULT_FILENAME
+		self.max_age_days = float(max_age_days or BuildResultsCache.DEFAULT_MAX_AGE_DAYS)
+		self.max_size_mb = float(max_size_mb or BuildResultsCache.DEFAULT_MAX_SIZE_MB)
+		self.is_refreshing = is_refreshing
+		self.hits = 0
+		self.misses = 0
+		self._lock = threading.Lock()
+		self._connection = sqlite3.connect(self.filename, check_same_thread=False)
+		self._connection.execute('PRAGMA journal_mode=WAL')
+		self._connection.execute('PRAGMA synchronous=NORMAL')
+		if self._connection.execute('PRAGMA user_version').fetchone()[0] != BuildResultsCache.SCHEMA_VERSION:
+			self._connection.execute('DROP TABLE IF EXISTS build_responses')
+			self._connection.execute('PRAGMA user_version = ' + str(BuildResultsCache.SCHEMA_VERSION))
+		self._connection.execute('CREATE TABLE IF NOT EXISTS build_responses (base_url TEXT NOT NULL, view_name TEXT NOT NULL, '
+			'job_name TEXT NOT NULL, build_id TEXT NOT NULL, is_test_report INTEGER NOT NULL, tree TEXT NOT NULL, '
+			'data BLOB NOT NULL, size INTEGER NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL, '
+			'PRIMARY KEY (base_url, view_name, job_name, build_id, is_test_report, tree))')
+		self._connection.commit()
+		self.evict()
+
+	def get(self, base_url, view_name, job_name, build_id, is_test_report=False, tree=None):
+		blob = self.get_compressed(base_url, view_name, job_name, build_id, is_test_report, tree)
+		return json.loads(zlib.decompress(blob).decode('utf-8')) if blob else None
+
+	def get_compressed(self, base_url, view_name, job_name, build_id, is_test_report=False, tree=None):
+		row = None
+		key = (base_url, view_name, job_name, str(build_id), int(is_test_report), tree or '')
+		with self._lock:
+			if not self.is_refreshing:
+				row = self._connection.execute('SELECT data FROM build_responses WHERE base_url = ? AND view_name = ? AND '
+					'job_name = ? AND build_id = ? AND is_test_report = ? AND tree = ?', key).fetchone()
+			if row:
+				self._connection.execute('UPDATE build_responses SET accessed_at = ? WHERE base_url = ? AND view_name = ? AND '
+					'job_name = ? AND build_id = ? AND is_test_report = ? AND tree = ?', (time.time(),) + key)
+				self.hits += 1
+			else:
+				self.misses += 1
+		return row[0] if row else None
+
+	def put(self, base_url, view_name, job_name, build_id, is_test_report, data, tree=None):
+		blob = zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8'))
+		self.put_compressed(base_url, view_name, job_name, build_id, is_test_report, blob, tree)
+
+	def put_compressed(self, base_url, view_name, job_name, build_id, is_test_report, blob, tree=None):
+		now = time.time()
+		with self._lock:
+			self._connection.execute('INSERT OR REPLACE INTO build_responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+				(base_url, view_name, job_name, str(build_id), int(is_test_report), tree or '', blob, len(blob), now, now))
+			self._connection.commit()
+
+	def evict(self):
+		oldest_allowed = time.time() - (self.max_age_days * BuildResultsCache.SECONDS_PER_DAY)
+		max_size = self.max_size_mb * BuildResultsCache.BYTES_PER_MB
+		with self._lock:
+			self._connection.execute('DELETE FROM build_responses WHERE created_at < ?', (oldest_allowed,))
+			total_size = 0
+			evicted_rows = []
+			for row in self._connection.execute('SELECT rowid, size FROM build_responses ORDER BY accessed_at DESC'):
+				total_size += row[1]
+				if total_size > max_size:
+					evicted_rows.append((row[0],))
+			self._connection.executemany('DELETE FROM build_responses WHERE rowid = ?', evicted_rows)
+			self._connection.commit()
+
+	def close(self):
+		with self._lock:
+			self._connection.commit()
+			self._connection.close()
+
+class MemoryResultsCache:
+	# Keeps the responses of one run in memory, compressed, in front of an optional persistent cache. Used when one run
+	# reports several configs, so a build that more than one of them covers is fetched (or read from disk) only once,
+	# even with --refresh or --no-cache.
+	def __init__(self, backing_cache=None):
+		self.backing_cache = backing_cache
+		self.memory_hits = 0
+		self._misses = 0
+		self._responses = {}
+		self._lock = threading.Lock()
+
+	@property
+	def hits(self):
+		return self.memory_hits + (self.backing_cache.hits if self.backing_cache else 0)
+
+	@property
+	def misses(self):
+		return self.backing_cache.misses if self.backing_cache else self._misses
+
+	def get(self, base_url, view_name, job_name, build_id, is_test_report=False, tree=None):
+		blob = self.get_compressed(base_url, view_name, job_name, build_id, is_test_report, tree)
+		return json.loads(zlib.decompress(blob).decode('utf-8')) if blob else None
+
+	def get_compressed(self, base_url, view_name, job_name, build_id, is_test_report=False, tree=None):
+		key = (base_url, view_name, job_name, str(build_id), bool(is_test_report), tree or '')
+		with self._lock:
+			blob = self._responses.get(key)
+			if blob:
+				self.memory_hits += 1
+				return blob
+		if self.backing_cache:
+			blob = self.backing_cache.get_compressed(base_url, view_name, job_name, build_id, is_test_report, tree)
+		with self._lock:
+			if blob:
+				self._responses[key] = blob
+			elif not self.backing_cache:
+				self._misses += 1
+		return blob
+
+	def put(self, base_url, view_name, job_name, build_id, is_test_report, data, tree=None):
+		blob = zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8'))
+		self.put_compressed(base_url, view_name, job_name, build_id, is_test_report, blob, tree)
+
+	def put_compressed(self, base_url, view_name, job_name, build_id, is_test_report, blob, tree=None):
+		with self._lock:
+			self._responses[(base_url, view_name, job_name, str(build_id), bool(is_test_report), tree or '')] = blob
+		if self.backing_cache:
+			self.backing_cache.put_compressed(base_url, view_name, job_name, build_id, is_test_report, blob, tree)
+
+	def close(self):
+		with self._lock:
+			self._responses = {}
+		if self.backing_cache:
+			self.backing_cache.close()
+
+class CompressedStreamReader:
+	# Reads a cached zlib blob back as a stream of JSON bytes without decompressing all of it at once.
+	CHUNK_SIZE = 16 * 1024
+
+	def __init__(self, blob):
+		self._blob = blob
+		self._offset = 0
+		self._decompressor = zlib.decompressobj()
+
+	def read(self, size=-1):
+		data = b''
+		while not data and (self._offset < len(self._blob) or self._decompressor.unconsumed_tail):
+			compressed = self._decompressor.unconsumed_tail
+			if not compressed:
+				compressed = self._blob[self._offset:self._offset + CompressedStreamReader.CHUNK_SIZE]
+				self._offset += len(compressed)
+			data = self._decompressor.decompress(compressed, size if size and size > 0 else 0)
+		if not data:
+			data = self._decompressor.flush()
+		return data
+
+class CompressingStreamReader:
+	# Passes a response stream through unchanged while compressing everything read, so a streamed response can be
+	# stored in the cache once it has been read to the end.
+	def __init__(self, stream):
+		self.stream = stream
+		self.is_complete = False
+		self._compressor = zlib.compressobj()
+		self._compressed_chunks = []
+
+	def read(self, size=-1):
+		data = self.stream.read(size)
+		if data:
+			self._compressed_chunks.append(self._compressor.compress(data))
+		else:
+			self.is_complete = True
+		return data
+
+	def compressed(self):
+		return b''.join(self._compressed_chunks) + self._compressor.flush()
+
+class TimedStreamReader:
+	# Passes a stream through unchanged while adding up the time spent in read(), so that reading a body which is
+	# parsed as it arrives can be told apart from the parsing itself.
+	def __init__(self, stream):
+		self.stream = stream
+		self.seconds = 0.0
+
+	def read(self, size=-1):
+		start = time.perf_counter()
+		try:
+			return self.stream.read(size)
+		finally:
+			self.seconds += time.perf_counter() - start
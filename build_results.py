@@ -1,109 +1,371 @@
+import gzip
 import json
-import urllib.request
 from urllib.error import HTTPError
+from urllib.parse import quote
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 import re
+import threading
+import time
 
-from reporting_ui import ProgressBar, ReportingStatus
+from http_pool import HttpConnectionPool
+from flaky_tests import FlakinessTracker
+from result_records import BuildResult, FailureLink, TestCaseResult
+from run_metrics import RunMetrics
+from reporting_ui import ReportingStatus
 
 class JenkinsClient:
+	LAST_BUILD_ID = 'lastBuild'
+	REQUEST_HEADERS = { 'Accept-Encoding': 'gzip' }
+	BUILD_FIELDS = ['id', 'building']
+	JOB_BUILD_FIELDS = ['number', 'result', 'building', 'timestamp']
+	SKIPPED_BUILD_RESULTS = ['ABORTED', 'NOT_BUILT']
+	TEST_REPORT_FIELDS = ['passCount', 'failCount']
+	TEST_CASES_PATH = ('suites', None, 'cases', None)
+	STREAM_CHUNK_SIZE = 64 * 1024
+	MAX_PREFETCH_WORKERS = 8
+
+	cache = None
+	connection_pool = HttpConnectionPool()
+	metrics = RunMetrics()
+	prefetch_executor = ThreadPoolExecutor(max_workers=MAX_PREFETCH_WORKERS)
+	is_streaming = False
+	_running_builds = set()
+	_finished_builds = set()
+
+	@classmethod
+	def json_response_from_request(cls, base_url, view_name, job_name, build_number, is_test_report=False, tree=None):
+		build_id = cls._build_id(build_number)
+		is_cacheable = cls._is_cacheable(base_url, view_name, job_name, build_id)
+		if is_cacheable:
+			data = cls.cache.get(base_url, view_name, job_name, build_id, is_test_report, tree)
+			if data is not None:
+				return data
+			if is_test_report:
+				is_cacheable = cls._is_finished_build(base_url, view_name, job_name, build_id)
+
+		data = cls._json_from_url(cls._request_url(base_url, view_name, job_name, build_id, is_test_report, tree))
+		if data.get('building'):
+			cls._running_builds.add((base_url, view_name, job_name, str(data['id'])))
+		elif is_cacheable:
+			cls.cache.put(base_url, view_name, job_name, build_id, is_test_report, data, tree)
+		return data
+
+	@classmethod
+	@contextmanager
+	def stream_from_request(cls, base_url, view_name, job_name, build_number, is_test_report=False, tree=None):
+		# Same request as json_response_from_request, but yields the JSON body as a binary stream for incremental
+		# parsing instead of decoding it all at once. The stream adds up the time spent reading it in its seconds.
+		from build_cache import CompressedStreamReader, CompressingStreamReader, TimedStreamReader
+		build_id = cls._build_id(build_number)
+		is_cacheable = cls._is_cacheable(base_url, view_name, job_name, build_id)
+		blob = cls.cache.get_compressed(base_url, view_name, job_name, build_id, is_test_report, tree) if is_cacheable else None
+		if blob:
+			yield TimedStreamReader(CompressedStreamReader(blob))
+		else:
+			if is_cacheable and is_test_report:
+				is_cacheable = cls._is_finished_build(base_url, view_name, job_name, build_id)
+			url = cls._request_url(base_url, view_name, job_name, build_id, is_test_report, tree)
+			start = time.perf_counter()
+			with cls.connection_pool.open(url, JenkinsClient.REQUEST_HEADERS) as response:
+				response_seconds = time.perf_counter() - start
+				stream = gzip.GzipFile(fileobj=response) if response.headers.get('Content-Encoding') == 'gzip' else response
+				compressing_stream = CompressingStreamReader(stream) if is_cacheable else None
+				stream = TimedStreamReader(compressing_stream or stream)
+				try:
+					yield stream
+					while stream.read(JenkinsClient.STREAM_CHUNK_SIZE):
+						pass
+				finally:
+					# The body is read while it is being parsed, so the request is recorded once it has been read.
+					cls.metrics.record_request(url, response_seconds + stream.seconds, int(response.headers.get('Content-Length') or 0))
+				if is_cacheable:
+					cls.cache.put_compressed(base_url, view_name, job_name, build_id, is_test_report, compressing_stream.compressed(),
+						tree)
+
+	@classmethod
+	def recent_builds(cls, base_url, view_name, job_name, number_of_builds):
+		# A single job-level request lists the most recent builds (newest first) with their status, so callers know
+		# which build numbers exist without probing each one. Never cached, since it changes with every new build.
+		# 'builds' stops at the newest 100, so windows longer than that need 'allBuilds'.
+		tree = 'allBuilds[' + ','.join(JenkinsClient.JOB_BUILD_FIELDS) + ']{0,' + str(int(number_of_builds)) + '}'
+		url = (base_url + '/view/' + view_name.replace(' ', '%20') + '/job/' + job_name.replace(' ', '%20') + '/api/json?tree=' + 
+			quote(tree, safe=','))
+		builds = cls._json_from_url(url).get('allBuilds', [])
+		cls._finished_builds.update((base_url, view_name, job_name, str(build['number'])) for build in builds
+			if not build.get('building'))
+		return builds
+
+	@classmethod
+	def is_completed_build(cls, build):
+		return not build.get('building') and build.get('result') not in JenkinsClient.SKIPPED_BUILD_RESULTS
+
+	@classmethod
+	def _json_from_url(cls, url):
+		start = time.perf_counter()
+		with cls.connection_pool.open(url, JenkinsClient.REQUEST_HEADERS) as response:
+			raw_response = response.read()
+			bytes_received = len(raw_response)
+			if response.headers.get('Content-Encoding') == 'gzip':
+				raw_response = gzip.decompress(raw_response)
+		cls.metrics.record_request(url, time.perf_counter() - start, bytes_received, len(raw_response))
+		return json.loads(raw_response.decode('utf-8'))
+
+	@classmethod
+	def build_tree(cls, results_parsers):
+		fields = cls._merge_fields(JenkinsClient.BUILD_FIELDS, [parser.BUILD_FIELDS for parser in results_parsers])
+		return ','.join(fields)
+
+	@classmethod
+	def test_report_tree(cls, results_parsers):
+		case_fields = cls._merge_fields([], [parser.CASE_FIELDS for parser in results_parsers])
+		return ','.join(JenkinsClient.TEST_REPORT_FIELDS + ['suites[cases[' + ','.join(case_fields) + ']]'])
+
 	@classmethod
-	def json_response_from_request(cls, base_url, view_name, job_name, build_number, is_test_report=False):
+	def _build_id(cls, build_number):
+		return JenkinsClient.LAST_BUILD_ID if int(build_number) == -1 else str(build_number)
+
+	@classmethod
+	def _is_cacheable(cls, base_url, view_name, job_name, build_id):
+		return (cls.cache is not None and build_id != JenkinsClient.LAST_BUILD_ID and 
+			(base_url, view_name, job_name, build_id) not in cls._running_builds)
+
+	@classmethod
+	def _is_finished_build(cls, base_url, view_name, job_name, build_id):
+		# A test report does not say whether its build is still running, so unless the job listing already said so, the
+		# build itself is asked before a test report may be cached; a partial report would otherwise be served for good.
+		key = (base_url, view_name, job_name, build_id)
+		if key not in cls._finished_builds:
+			data = cls.json_response_from_request(base_url, view_name, job_name, build_id, tree=','.join(JenkinsClient.BUILD_FIELDS))
+			if not data.get('building'):
+				cls._finished_builds.add(key)
+		return key in cls._finished_builds
+
+	@classmethod
+	def _request_url(cls, base_url, view_name, job_name, build_id, is_test_report, tree):
 		view = view_name.replace(' ', '%20')
 		job = job_name.replace(' ', '%20')
-		build_id = 'lastBuild' if int(build_number) == -1 else str(build_number)
-		response = urllib.request.urlopen(base_url + '/view/' + view + '/job/' + job + '/' + build_id + 
-			('/testReport' if is_test_report else '') + '/api/json')
-		str_response = response.read().decode('utf-8')
-		return json.loads(str_response)
+		return (base_url + '/view/' + view + '/job/' + job + '/' + build_id + ('/testReport' if is_test_report else '') + 
+			'/api/json' + ('?tree=' + quote(tree, safe=',') if tree else ''))
 
 	@classmethod
-	def latest_build_id(cls, base_url, view_name, job_name):
-		data = cls.json_response_from_request(base_url, view_name, job_name, -1)
-		return int(data['id'])
+	def _merge_fields(cls, fields, parser_fields):
+		merged_fields = list(fields)
+		for next_fields in parser_fields:
+			merged_fields += [field for field in next_fields if field not in merged_fields]
+		return merged_fields
 
 	@classmethod
 	def construct_test_results_for_build(cls, job_config, build_number, is_rerun=False, logger=None):
-		result = { 'failure_links': [] }
-		application = None
+		result = BuildResult(int(build_number))
 		job = job_config.job(is_rerun)
+		build_context = BuildContext(job_config, job, build_number)
+		if any(parser.BUILD_FIELDS for parser in job_config.results_parsers):
+			build_context.prefetch_build_data()
 
 		try:
-			data = JenkinsClient.json_response_from_request(job_config.base_url, job_config.view_name, job, build_number, True)
-			for case in data['suites'][0]['cases']:
-				class_name_parts = case['className'].split('.')
-				for parser in job_config.results_parsers:
-					result = parser.handle_test_case(job_config, case, class_name_parts, job, build_number, result)
-				
-			result['number_passing'] = data['passCount']
-			result['number_failing'] = data['failCount']
+			tree = JenkinsClient.test_report_tree(job_config.results_parsers)
+			if cls.is_streaming:
+				from json_stream import JsonStreamReader
+				with cls.stream_from_request(job_config.base_url, job_config.view_name, job, build_number, True, tree) as stream:
+					start = time.perf_counter()
+					try:
+						for path, value in JsonStreamReader(stream).iter_values(JenkinsClient.TEST_CASES_PATH):
+							if JsonStreamReader.matches_path(path, JenkinsClient.TEST_CASES_PATH):
+								result = cls._handle_test_case(job_config, value, job, build_number, result)
+							elif path == ('passCount',):
+								result.number_passing = value
+							elif path == ('failCount',):
+								result.number_failing = value
+					finally:
+						# Reading the body counts towards the request, not the parsing.
+						cls.metrics.record('parse_build', time.perf_counter() - start - stream.seconds, job)
+			else:
+				data = build_context.test_report()
+				with cls.metrics.timed('parse_build', job):
+					result = cls.parse_test_report(job_config, data, job, build_number, result)
 
 			for parser in job_config.results_parsers:
 				if callable(getattr(parser, 'parse_application_title', None)):
-					result = parser.parse_application_title(job_config, job, build_number, result)
+					result = parser.parse_application_title(job_config, build_context, result)
 		except HTTPError:
 			logger.log_info('No such build number \'' + str(build_number) + '\' for job \'' + job + '\'; Skipping...')
 			result = None
 
 		return result
 
+	@classmethod
+	def parse_test_report(cls, job_config, data, job, build_number, result):
+		columns = TestCaseColumns()
+		for suite in data['suites']:
+			columns.add_cases(suite['cases'])
+		for parser in job_config.results_parsers:
+			result = parser.handle_test_cases(job_config, columns, job, build_number, result)
+		result.number_passing = data['passCount']
+		result.number_failing = data['failCount']
+		return result
+
+	@classmethod
+	def _handle_test_case(cls, job_config, case, job, build_number, result):
+		class_name_parts = case['className'].split('.')
+		for parser in job_config.results_parsers:
+			result = parser.handle_test_case(job_config, case, class_name_parts, job, build_number, result)
+		return result
+
+class BuildContext:
+	# The Jenkins documents of one build, shared by everything that parses it. Each document is requested at most once,
+	# when first needed; prefetching starts the request in the background so it overlaps with the test report.
+	def __init__(self, job_config, job, build_number):
+		self.job_config = job_config
+		self.job = job
+		self.build_number = build_number
+		self._documents = {}
+		self._lock = threading.Lock()
+
+	def test_report(self):
+		return self._document(True, JenkinsClient.test_report_tree(self.job_config.results_parsers)).result()
+
+	def build_data(self):
+		return self._document(False, JenkinsClient.build_tree(self.job_config.results_parsers)).result()
+
+	def prefetch_build_data(self):
+		self._document(False, JenkinsClient.build_tree(self.job_config.results_parsers), is_prefetched=True)
+
+	def _document(self, is_test_report, tree, is_prefetched=False):
+		key = (is_test_report, tree)
+		with self._lock:
+			future = self._documents.get(key)
+			is_requesting = future is None
+			if is_requesting:
+				if is_prefetched:
+					future = JenkinsClient.prefetch_executor.submit(self._request, is_test_report, tree)
+				else:
+					future = Future()
+				self._documents[key] = future
+		if is_requesting and not is_prefetched:
+			try:
+				future.set_result(self._request(is_test_report, tree))
+			except Exception as exception:
+				future.set_exception(exception)
+		return future
+
+	def _request(self, is_test_report, tree):
+		return JenkinsClient.json_response_from_request(self.job_config.base_url, self.job_config.view_name, self.job,
+			self.build_number, is_test_report, tree)
+
+class TestCaseColumns:
+	# All test cases of one build stored column by column, so parsers can work on a whole build at once instead of
+	# being called once per case.
+	def __init__(self):
+		self.class_names = []
+		self.names = []
+		self.statuses = []
+		self._class_name_parts = None
+
+	def add_cases(self, cases):
+		self.class_names += [case['className'] for case in cases]
+		self.names += [case['name'] for case in cases]
+		self.statuses += [case['status'] for case in cases]
+		self._class_name_parts = None
+
+	def class_name_parts(self):
+		if self._class_name_parts is None:
+			# The same className recurs for every case in a test file, so each distinct one is split only once.
+			parts_by_class_name = { class_name: class_name.split('.') for class_name in set(self.class_names) }
+			self._class_name_parts = [parts_by_class_name[class_name] for class_name in self.class_names]
+		return self._class_name_parts
+
+	def passing_flags(self):
+		return [status not in TestResultsParser.FAILING_STATUSES for status in self.statuses]
+
+	def failing_indexes(self):
+		return [index for index, status in enumerate(self.statuses) if status in TestResultsParser.FAILING_STATUSES]
+
+	def __len__(self):
+		return len(self.names)
+
 class TestResultsParser:
+	# Fields each parser reads from every test case and from the build JSON; JenkinsClient requests only these.
+	CASE_FIELDS = ['className', 'name', 'status']
+	BUILD_FIELDS = []
+	FAILING_STATUSES = ['FAILED', 'REGRESSION']
+
 	@classmethod
 	def handle_test_case(cls, job_config, case, class_name_parts, job, build_number, result):
 		raise Exception('Cannot implement TestResultsParser')
 
+	@classmethod
+	def handle_test_cases(cls, job_config, columns, job, build_number, result):
+		class_name_parts = columns.class_name_parts()
+		for index in range(0, len(columns)):
+			case = { 'className': columns.class_names[index], 'name': columns.names[index], 'status': columns.statuses[index] }
+			result = cls.handle_test_case(job_config, case, class_name_parts[index], job, build_number, result)
+		return result
+
 	@classmethod
 	def is_application_parsable(cls, application, class_name_parts, job_config):
 		return (len(class_name_parts) > job_config.application_classname_index)
 
 	@classmethod
-	def parse_failure_url(cls, job_config, case, class_name_parts, job, build_number):
-		url = None
-		if case['status'] in ['FAILED', 'REGRESSION']:
-			class_name = ''
-			for i in range(0, len(class_name_parts) - 1):
-				class_name += class_name_parts[i] + '.'
-			url = (job_config.base_url + '/view/' + job_config.view_name + '/job/' + job + '/' + str(build_number) + '/testReport/junit/' + class_name[:-1] + '/' + 
-				class_name_parts[-1] + '/' + case['name'])
-		return url
+	def construct_failure_link(cls, job_config, case, class_name_parts, job, build_number):
+		failure_link = None
+		if case['status'] in TestResultsParser.FAILING_STATUSES:
+			failure_link = FailureLink(case['name'], cls.failure_file_name(job_config, class_name_parts),
+				cls.failure_url_prefix(job_config, job, build_number), cls.failure_class_path(class_name_parts))
+		return failure_link
+
+	@classmethod
+	def failure_url_prefix(cls, job_config, job, build_number):
+		return job_config.base_url + '/view/' + job_config.view_name + '/job/' + job + '/' + str(build_number) + '/testReport/junit/'
+
+	@classmethod
+	def failure_class_path(cls, class_name_parts):
+		return '.'.join(class_name_parts[:-1]) + '/' + class_name_parts[-1] + '/'
 
 	@classmethod
-	def construct_failure_link_value(cls, job_config, case_name, class_name_parts):
-		link_value = case_name
+	def failure_file_name(cls, job_config, class_name_parts):
+		file_name = None
 		if getattr(job_config, 'test_filename_index', None) and len(class_name_parts) > job_config.test_filename_index:
-			link_value = class_name_parts[job_config.test_filename_index] + '.' + link_value
-		return link_value
+			file_name = class_name_parts[job_config.test_filename_index]
+		return file_name
 
 class ApplicationNameParser(TestResultsParser):
+	BUILD_FIELDS = ['actions[parameters[name,value]]']
+
 	@classmethod
 	def handle_test_case(cls, job_config, case, class_name_parts, job, build_number, result):
-		modified_result = result
-		if 'application' not in modified_result:
-			modified_result['application'] = None
-		if cls.is_application_parsable(modified_result['application'], class_name_parts, job_config): 
-			application = None
-			index = 0
-			while (not application) and index < len(job_config.classname_index_exceptions):
-				exception = job_config.classname_index_exceptions[index]
-				exception_index = int(exception['index'])
-				if len(class_name_parts) > exception_index and class_name_parts[exception_index] == exception['classname']:
-					application = exception['application']
-				index += 1
-			if not application:
-				application = class_name_parts[job_config.application_classname_index]
-				if job_config.application_name_delimiter and job_config.application_name_delimiter in application:
-					application = application.split(job_config.application_name_delimiter)[1]
-			modified_result['application'] = application
-
-		failure_url = cls.parse_failure_url(job_config, case, class_name_parts, job, build_number)
-		link_value = cls.construct_failure_link_value(job_config, case['name'], class_name_parts)
-		if failure_url:
-			modified_result['failure_links'].append({'value': link_value, 'url': failure_url})
-		return modified_result	
+		is_parsable, application, app_title, failure_class_path = job_config.application_resolver.resolve(case['className'])
+		if is_parsable:
+			result.application = application
+
+		if case['status'] in TestResultsParser.FAILING_STATUSES:
+			result.failure_links.append(FailureLink(case['name'], cls.failure_file_name(job_config, class_name_parts),
+				cls.failure_url_prefix(job_config, job, build_number), failure_class_path))
+		return result
+
+	@classmethod
+	def handle_test_cases(cls, job_config, columns, job, build_number, result):
+		resolver = job_config.application_resolver
+		# Every parsable case overwrites the application, so only the last parsable one matters.
+		index = len(columns) - 1
+		while index >= 0 and not resolver.resolve(columns.class_names[index])[0]:
+			index -= 1
+		if index >= 0:
+			result.application = resolver.resolve(columns.class_names[index])[1]
+
+		class_name_parts = columns.class_name_parts()
+		# One prefix string is shared by every failure of the build.
+		failure_url_prefix = cls.failure_url_prefix(job_config, job, build_number)
+		result.failure_links += [FailureLink(columns.names[index], cls.failure_file_name(job_config, class_name_parts[index]),
+			failure_url_prefix, resolver.resolve(columns.class_names[index])[3]) for index in columns.failing_indexes()]
+		return result
+
+	@classmethod
+	def parse_application_title(cls, job_config, build_context, result):
+		return cls.apply_application_title(job_config, build_context.build_data(), result)
 
 	@classmethod
-	def parse_application_title(cls, job_config, job, build_number, result):
-		modified_result = result
-		data = JenkinsClient.json_response_from_request(job_config.base_url, job_config.view_name, job, build_number)
+	def apply_application_title(cls, job_config, data, result):
 		parameters = None
 
 		if 'parameters' in data['actions'][0]:
@@ -113,8 +375,7 @@ class ApplicationNameParser(TestResultsParser):
 		else:
 			raise Exception('Could not find build parameters in JSON response')
 
-		application = modified_result['application']
-		del modified_result['application']
+		application = result.application
 		index = 0
 		while not application:
 			if index >= len(parameters):
@@ -124,144 +385,242 @@ class ApplicationNameParser(TestResultsParser):
 					application = parameters[index]['value']
 			index += 1
 
-		modified_result['app_title'] = job_config.app_title_mappings[application] if application in job_config.app_title_mappings else 'Unknown Application'	
-		return modified_result
+		result.app_title = job_config.application_resolver.app_title(application)
+		return result
 
 class TestCaseNamesParser(TestResultsParser):
 	@classmethod
 	def handle_test_case(cls, job_config, case, class_name_parts, job, build_number, result):
-		modified_result = result
-		if 'test_cases' not in modified_result:
-			modified_result['test_cases'] = []
-		is_passing = (case['status'] not in ['FAILED', 'REGRESSION'])
-
-		next_case = { 'name': case['name'], 'is_passing': is_passing, 'failure_link': None }
-		failure_url = cls.parse_failure_url(job_config, case, class_name_parts, job, build_number)
-		if failure_url:
-			failure_link = cls.construct_failure_link_value(job_config, case['name'], class_name_parts)
-			next_case['failure_link'] = { 'value': failure_link, 'url': failure_url }
-		modified_result['test_cases'].append(next_case)
-		return modified_result
+		is_passing = (case['status'] not in TestResultsParser.FAILING_STATUSES)
+		failure_link = cls.construct_failure_link(job_config, case, class_name_parts, job, build_number)
+		result.test_cases.append(TestCaseResult(case['name'], is_passing, failure_link, result.build_number))
+		return result
+
+	@classmethod
+	def handle_test_cases(cls, job_config, columns, job, build_number, result):
+		test_cases = [TestCaseResult(name, is_passing, None, result.build_number)
+			for name, is_passing in zip(columns.names, columns.passing_flags())]
+
+		class_name_parts = columns.class_name_parts()
+		failure_url_prefix = cls.failure_url_prefix(job_config, job, build_number)
+		# Failures of the same test file share one class path string.
+		class_paths = {}
+		for index in columns.failing_indexes():
+			class_name = columns.class_names[index]
+			if class_name not in class_paths:
+				class_paths[class_name] = cls.failure_class_path(class_name_parts[index])
+			test_cases[index].failure_link = FailureLink(columns.names[index], cls.failure_file_name(job_config, class_name_parts[index]),
+				failure_url_prefix, class_paths[class_name])
+		result.test_cases += test_cases
+		return result
 
 class BuildResultsService:
 	DEFAULT_CONFIG_LOCATION = "./"
-	def __init__(self, job_config, logger):
+	DEFAULT_MAX_FETCH_WORKERS = 1
+	def __init__(self, job_config, logger, snapshot=None, progress_bus=None, output_backends=None):
 		self.job_config = job_config
 		self.logger = logger
-		self.reporting_status = ReportingStatus(0, 1)
-		self.progress_bar = None
+		self.snapshot = snapshot
+		self.progress_bus = progress_bus
+		self.output_backends = output_backends or []
+		self.reporting_status = ReportingStatus(None, 1)
+		# (job, build number) -> when the build started, in epoch milliseconds, as listed by construct_build_number_range.
+		self.build_timestamps = {}
+		# job -> numbers of the builds inside the reporting window that are still running.
+		self.running_builds = {}
 
 	def construct_build_number_range(self, is_rerun=False):
+		# The reporting window still ends at the latest build, but only builds that exist and have completed (not
+		# aborted) inside it are returned.
 		build_number_range = []
 		if (not is_rerun) or self.job_config.is_rerun_defined():
-			last_build_number = JenkinsClient.latest_build_id(self.job_config.base_url, self.job_config.view_name, 
-				self.job_config.job(is_rerun))
-			build_number_range = \
-				range(last_build_number - self.job_config.build_history_reporting_length, last_build_number + 1)
+			history_length = self.job_config.build_history_reporting_length
+			builds = JenkinsClient.recent_builds(self.job_config.base_url, self.job_config.view_name, self.job_config.job(is_rerun),
+				history_length + 1)
+			if builds:
+				job = self.job_config.job(is_rerun)
+				self.build_timestamps.update(((job, build['number']), build.get('timestamp')) for build in builds)
+				first_build_number = builds[0]['number'] - history_length
+				build_number_range = sorted(build['number'] for build in builds 
+					if build['number'] >= first_build_number and JenkinsClient.is_completed_build(build))
+				self.running_builds[job] = [build['number'] for build in builds
+					if build['number'] >= first_build_number and build.get('building')]
 		return build_number_range
 
-	def compose_rerun_regression_results(self):
-		build_results = []
+	def fetch_build_results(self, build_number_range, is_rerun=False):
+		# Builds are fetched concurrently when more than one worker is configured, but results are always
+		# yielded in build-number order so that later builds still win when results are merged.
+		max_workers = getattr(self.job_config, 'max_fetch_workers', None) or BuildResultsService.DEFAULT_MAX_FETCH_WORKERS
+		job = self.job_config.job(is_rerun)
+
+		def fetch_build(number):
+			result = JenkinsClient.construct_test_results_for_build(self.job_config, number, is_rerun, logger=self.logger)
+			if result:
+				result.timestamp = self.build_timestamps.get((job, number))
+			return result
+
+		if max_workers <= 1 or len(build_number_range) <= 1:
+			for number in build_number_range:
+				yield fetch_build(number)
+		else:
+			with ThreadPoolExecutor(max_workers=max_workers) as executor:
+				for result in executor.map(fetch_build, build_number_range):
+					yield result
 
-		build_info = {}
+	def compose_rerun_regression_results(self):
 		job_build_range = self.construct_build_number_range()
 		rerun_build_range = self.construct_build_number_range(True)
-		build_info['starting_number'] = job_build_range[0]
-		total_builds = len(job_build_range) + len(rerun_build_range)
-		build_info['ending_number'] = build_info['starting_number'] + total_builds
-		build_info['current_number'] = build_info['starting_number']
-		self._start_progress_bar(build_info=build_info)
-
-		for number in job_build_range:
-			next_result = JenkinsClient.construct_test_results_for_build(self.job_config, number, logger=self.logger)
-			if next_result:
-				if next_result['app_title'] in [result['app_title'] for result in build_results]:
-					build_results = list(filter(lambda result: result['app_title'] != next_result['app_title'], build_results))
-				build_results.append(next_result)
-			self.reporting_status.current_build_number += 1
-		self.reporting_status.current_build_number += 1
-
-		rerun_results = []
-		for number in rerun_build_range:
-			next_result = JenkinsClient.construct_test_results_for_build(self.job_config, number, True, logger=self.logger)
-			if next_result:
-				if next_result['app_title'] in [result['app_title'] for result in rerun_results]:
-					rerun_results = list(filter(lambda result: result['app_title'] != next_result['app_title'], rerun_results))
-				rerun_results.append(next_result)
-			self.reporting_status.current_build_number += 1
-		self.reporting_status.current_build_number += 1
-		self.progress_bar.join()
+		job_state = self._job_state(job_build_range, BuildResult)
+		rerun_state = self._job_state(rerun_build_range, BuildResult, True)
+		job_builds = BuildResultsService.unprocessed_builds(job_state, job_build_range)
+		rerun_builds = BuildResultsService.unprocessed_builds(rerun_state, rerun_build_range)
+		self._start_progress(len(job_builds) + len(rerun_builds) + 2)
+
+		build_results = BuildResultsService.index_latest(job_state['results'], 'app_title')
+		stored_job_state = self._fold_builds(job_state, job_builds,
+			lambda result: BuildResultsService.replace_latest(build_results, result.app_title, result),
+			lambda: { 'results': list(build_results.values()) })
+		self.reporting_status.advance()
+
+		rerun_results = BuildResultsService.index_latest(rerun_state['results'], 'app_title')
+		stored_rerun_state = self._fold_builds(rerun_state, rerun_builds,
+			lambda result: BuildResultsService.replace_latest(rerun_results, result.app_title, result),
+			lambda: { 'results': list(rerun_results.values()) }, True)
+		self.reporting_status.finish()
+
+		job_state['results'] = list(build_results.values())
+		rerun_state['results'] = list(rerun_results.values())
+		self._update_job_state(stored_job_state or job_state)
+		self._update_job_state(stored_rerun_state or rerun_state, True)
 
 		aggregated_results = []
-		for result in build_results:
-			filtered = list(filter(lambda rerun_result: rerun_result['app_title'] == result['app_title'], rerun_results))
-			second = filtered[0] if len(filtered) > 0 else result
-			aggregated_results.append({
-				'app_title': result['app_title'],
-				'number_passing': (result['number_passing'] + result['number_failing']) - second['number_failing'],
-				'number_failing': second['number_failing'],
-				'failure_links': second['failure_links']
-			})
+		with JenkinsClient.metrics.timed('aggregate', self.job_config.job_name):
+			for app_title, result in build_results.items():
+				second = rerun_results.get(app_title, result)
+				aggregated_results.append({
+					'app_title': app_title,
+					'number_passing': (result.number_passing + result.number_failing) - second.number_failing,
+					'number_failing': second.number_failing,
+					'failure_links': second.failure_links
+				})
 		return aggregated_results
 
 	def compose_single_job_regression_results(self, app_title):
-		data = JenkinsClient.json_response_from_request(self.job_config.base_url, self.job_config.view_name, 
-			self.job_config.job_name, -1)
+		build_number_range = self.construct_build_number_range()
+		job_state = self._job_state(build_number_range, TestCaseResult)
+		tests = BuildResultsService.index_latest(job_state['results'], 'case_name')
+		flakiness = FlakinessTracker.from_dict(job_state.get('flakiness'))
+		if build_number_range:
+			flakiness.trim(build_number_range[0])
+		else:
+			flakiness = FlakinessTracker()
+
+		def fold(new_results):
+			# Group jobs have no application parameter; the app is the one this job is mapped to.
+			new_results.app_title = new_results.app_title or app_title
+			self.fold_test_cases(tests, new_results, flakiness)
+
+		stored_job_state = self._fold_builds(job_state, BuildResultsService.unprocessed_builds(job_state, build_number_range), fold,
+			lambda: { 'results': list(tests.values()), 'flakiness': flakiness.to_dict() })
+
+		job_state['results'] = list(tests.values())
+		job_state['flakiness'] = flakiness
+		self._update_job_state(stored_job_state or job_state)
 
-		last_build_number = int(data['id'])
-		case_names = []
-		status_count = 0
 		passing_count = 0
-		failing_count = 0
 		failure_links = []
-
-		tests = []
-
-		results_service = BuildResultsService(self.job_config, self.logger)
-		for build_number in results_service.construct_build_number_range():
-			new_results = JenkinsClient.construct_test_results_for_build(self.job_config, build_number, logger=self.logger)
-			if new_results:
-				for case in new_results['test_cases']:
-					case_name_tokens = [case['name']]
-					if getattr(self.job_config, 'test_name_delimiter', None):
-						case_name_tokens = re.compile(self.job_config.test_name_delimiter).split(case['name'])
-					case_name = case_name_tokens[1] if len(case_name_tokens) > 1 else case_name_tokens[0]
-					if case_name in [test['case_name'] for test in tests]:
-						tests = list(filter(lambda test: test['case_name'] != case_name, tests))
-
-					# failure_value = TestResultsParser.construct_failure_link_value(self.job_config, case['name'])
-					failure_link = case['failure_link'] #{ 'value': case_name, 'url': case['failure_url'] } if case['failure_url'] else None
-					new_test = { 
-						'case_name': case_name, 
-						'is_passing': case['is_passing'], 
-						'failure_link': failure_link
-					}
-					tests.append(new_test)
-
-		passing_count = len(list(filter(lambda test: test['is_passing'], tests)))
-		failing_count = len(list(filter(lambda test: not test['is_passing'], tests)))
-		failure_links = [test['failure_link'] for test in tests if test['failure_link']]
+		with JenkinsClient.metrics.timed('aggregate', self.job_config.job_name):
+			for test in tests.values():
+				if test.is_passing:
+					passing_count += 1
+				if test.failure_link:
+					failure_links.append(test.failure_link)
+			flaky_tests = flakiness.flaky_tests()
+		JenkinsClient.metrics.record_flaky_tests(app_title, len(flakiness.stats), flaky_tests)
 		return {
 			'app_title': app_title,
 			'number_passing': passing_count,
-			'number_failing': failing_count,
-			'failure_links': failure_links
+			'number_failing': len(tests) - passing_count,
+			'failure_links': failure_links,
+			'flaky_tests': flaky_tests
 		}
 
-	def _start_progress_bar(self, is_rerun=False, build_info=None):
-		if build_info:
-			self.reporting_status.starting_build_number = build_info['starting_number']
-			self.reporting_status.ending_build_number = build_info['ending_number']
-			self.reporting_status.current_build_number = build_info['current_number']
+	def fold_test_cases(self, tests, new_results, flakiness=None):
+		test_name_delimiter = getattr(self.job_config, 'test_name_delimiter', None)
+		delimiter_pattern = re.compile(test_name_delimiter) if test_name_delimiter else None
+		for case in new_results.test_cases:
+			if delimiter_pattern:
+				case_name_tokens = delimiter_pattern.split(case.case_name)
+				case.case_name = case_name_tokens[1] if len(case_name_tokens) > 1 else case_name_tokens[0]
+			BuildResultsService.replace_latest(tests, case.case_name, case)
+			if flakiness:
+				flakiness.add_case(case.case_name, new_results.build_number, case.is_passing, case.failure_link)
+
+	@staticmethod
+	def empty_job_state(build_number_range):
+		starting_number = build_number_range[0] if len(build_number_range) > 0 else 0
+		return { 'watermark': starting_number - 1, 'results': [] }
+
+	@staticmethod
+	def unprocessed_builds(job_state, build_number_range):
+		return [number for number in build_number_range if number > job_state['watermark']]
+
+	@staticmethod
+	def index_latest(results, key):
+		return { getattr(result, key): result for result in results }
+
+	@staticmethod
+	def replace_latest(latest_results, key, result):
+		# Dicts keep insertion order, so removing the key first moves a replaced result to the end exactly like the
+		# old remove-then-append on a list did.
+		latest_results.pop(key, None)
+		latest_results[key] = result
+
+	def _fold_builds(self, job_state, build_numbers, fold, settled_state, is_rerun=False):
+		# Folds the builds in order, moving the watermark along, but only through builds that are settled. A build still
+		# running, or one that could not be fetched, must be folded before the builds after it, so the next run fetches
+		# it and every later build again; the state stored for that run is the one from just before it, which
+		# settled_state() returns. The builds after it still count towards this run's report.
+		running_builds = [number for number in self.running_builds.get(self.job_config.job(is_rerun), [])
+			if number > job_state['watermark']]
+		stored_state = None
+		for number, result in zip(build_numbers, self.fetch_build_results(build_numbers, is_rerun)):
+			if stored_state is None and (not result or any(running < number for running in running_builds)):
+				stored_state = dict(job_state, **settled_state())
+			if result:
+				self._export_build(result, is_rerun)
+				with JenkinsClient.metrics.timed('aggregate', self.job_config.job_name):
+					fold(result)
+				if stored_state is None:
+					job_state['watermark'] = number
+			self.reporting_status.advance()
+		return stored_state
+
+	def _export_build(self, result, is_rerun=False):
+		# Raw results go out before folding, which trims test case names down to their deduplication keys.
+		if self.output_backends:
+			with JenkinsClient.metrics.timed('export', self.job_config.job_name):
+				for backend in self.output_backends:
+					backend.add_build(self.job_config, self.job_config.job(is_rerun), result)
+
+	def _job_state(self, build_number_range, record_class, is_rerun=False):
+		job_state = BuildResultsService.empty_job_state(build_number_range)
+		# Without a rerun job, job(True) falls back to the main job, whose stored results must not be read as reruns.
+		if self.snapshot and (not is_rerun or self.job_config.is_rerun_defined()):
+			job_state = self.snapshot.job_state(self.job_config.base_url, self.job_config.view_name, self.job_config.job(is_rerun), 
+				job_state, record_class)
+		return job_state
+
+	def _update_job_state(self, job_state, is_rerun=False):
+		if self.snapshot and (not is_rerun or self.job_config.is_rerun_defined()):
+			self.snapshot.update_job_state(self.job_config.base_url, self.job_config.view_name, self.job_config.job(is_rerun), 
+				job_state)
+
+	def _start_progress(self, total_steps):
+		if self.progress_bus:
+			self.reporting_status = self.progress_bus.task(self.job_config.job_name, total_steps)
 		else:
-			self._reset_reporting_status()
-		self.progress_bar = ProgressBar(self.reporting_status, self.job_config.job_name)
-		self.progress_bar.start()
+			self.reporting_status = ReportingStatus(self.job_config.job_name, total_steps)
 
 	def stop_execution(self):
-		self.progress_bar.stop_execution()
-
-	def _reset_reporting_status(self):
-		self.reporting_status.starting_build_number = 0
-		self.reporting_status.ending_build_number = 1
-		self.reporting_status.current_build_number = 0
\ No newline at end of file
+		self.reporting_status.stop()
@@ -1,26 +1,37 @@
 import xml.etree.ElementTree as ET
-import copy
+from functools import lru_cache
 
 from build_results import ApplicationNameParser, TestCaseNamesParser
 
 class JobReportingConfigManager:
 	DEFAULT_CONFIG_FILENAME = 'reporting_config.xml'
+	# <results_parser> names a class from this registry; register_results_parser adds more.
+	RESULTS_PARSERS = { 'ApplicationNameParser': ApplicationNameParser, 'TestCaseNamesParser': TestCaseNamesParser }
 
-	def __init__(self, config_filename=None):
+	def __init__(self, config_filename=None, max_fetch_workers=None):
 		self.config_filename = config_filename or JobReportingConfigManager.DEFAULT_CONFIG_FILENAME
+		self.max_fetch_workers = max_fetch_workers
 		self.job_group_configs = []
 		self.rerun_job_configs = []
 
 	def get_results_parser(self, xml_node):
 		parser_name = xml_node.find('results_parser').text
-		parser_module = __import__('build_results')
-		return getattr(parser_module, parser_name)
+		if parser_name not in JobReportingConfigManager.RESULTS_PARSERS:
+			raise Exception('Unknown results parser \'' + str(parser_name) + '\'; expected one of ' + 
+				', '.join(JobReportingConfigManager.RESULTS_PARSERS))
+		return JobReportingConfigManager.RESULTS_PARSERS[parser_name]
+
+	@classmethod
+	def register_results_parser(cls, parser):
+		cls.RESULTS_PARSERS[parser.__name__] = parser
 
 	def read_config_from_file(self):
 		tree = ET.parse(self.config_filename)
 		root = tree.getroot()
 		base_url = root.find('base_url').text
 		build_history_reporting_length = int(root.find('build_history_reporting_length').text)
+		max_fetch_workers = self._parse_node_text(root, 'max_fetch_workers')
+		max_fetch_workers = int(max_fetch_workers) if max_fetch_workers is not None else None
 
 		for job_config in root.findall('job_config'):
 			view_name = job_config.find('view_name').text
@@ -47,7 +58,9 @@ class JobReportingConfigManager:
 					config_obj.add_classname_index_exception(index, classname, application)
 			config_obj.base_url = base_url
 			config_obj.build_history_reporting_length = build_history_reporting_length
+			config_obj.max_fetch_workers = self.max_fetch_workers or max_fetch_workers
 			config_obj.add_results_parser(self.get_results_parser(job_config))
+			config_obj.compile_application_resolver()
 			self.rerun_job_configs.append(config_obj)
 
 		for job_group in root.findall('job_config_group'):
@@ -72,6 +85,7 @@ class JobReportingConfigManager:
 				job_group_config.add_job_config(app_title, job_name, view_name)
 			job_group_config.base_url = base_url
 			job_group_config.build_history_reporting_length = build_history_reporting_length
+			job_group_config.max_fetch_workers = self.max_fetch_workers or max_fetch_workers
 			job_group_config.add_results_parser(self.get_results_parser(job_group))
 			self.job_group_configs.append(job_group_config)
 
@@ -115,6 +129,7 @@ class JobReportingConfig:
 		self.application_classname_index = classname_index
 		self.base_url = None
 		self.build_history_reporting_length = 0
+		self.max_fetch_workers = None
 		self.results_parsers = []
 
 	def add_results_parser(self, parser):
@@ -145,10 +160,32 @@ class JobGroupReportingConfig(JobReportingConfig):
 		self.job_application_mappings[app_title] = { 'job': job_name, 'view': view_name }
 
 	def config_for(self, app_title):
-		config = copy.deepcopy(self)
-		config.job_name = self.job_application_mappings[app_title]['job']
-		config.view_name = self.job_application_mappings[app_title]['view'] 
-		return config
+		job_mapping = self.job_application_mappings[app_title]
+		return JobConfigView(self, job_mapping['job'], job_mapping['view'])
+
+class JobConfigView:
+	# One job of a job group: reads through to the group's shared config, overriding only the job and view names,
+	# instead of a full copy of the group per job.
+	__slots__ = ['config', 'job_name', 'view_name']
+
+	def __init__(self, config, job_name, view_name):
+		self.config = config
+		self.job_name = job_name
+		self.view_name = view_name
+
+	def __getattr__(self, name):
+		if name in JobConfigView.__slots__:
+			raise AttributeError(name)
+		return getattr(self.config, name)
+
+	def is_rerun_defined(self):
+		return False
+
+	def job(self, is_rerun):
+		return self.job_name
+
+	def __str__(self):
+		return '\{{ view_name: {}, job_name: {}, sheet_title: {} }}'.format(self.view_name, self.job_name, self.sheet_title)
 
 class RerunJobReportingConfig(JobReportingConfig):
 	def __init__(self, view_name, sheet_title, job_name, rerun_name, classname_index, test_filename_index, application_delimiter=None):
@@ -159,6 +196,7 @@ class RerunJobReportingConfig(JobReportingConfig):
 		self.app_title_mappings = {}
 		self.test_filename_index = test_filename_index
 		self.classname_index_exceptions = []
+		self.application_resolver = None
 
 	def add_app_title_mapping(self, app_key, title):
 		self.app_title_mappings[app_key] = title
@@ -168,4 +206,55 @@ class RerunJobReportingConfig(JobReportingConfig):
 			'index': index,
 			'classname': classname,
 			'application': application
-		})
\ No newline at end of file
+		})
+
+	def compile_application_resolver(self):
+		self.application_resolver = ApplicationResolver(self.application_classname_index, self.application_name_delimiter,
+			self.classname_index_exceptions, self.app_title_mappings)
+		return self.application_resolver
+
+class ApplicationResolver:
+	# Resolves a test case className to its application once; the same className recurs for every case in a test
+	# file, so later lookups are served from a bounded LRU memo.
+	DEFAULT_CACHE_SIZE = 4096
+	UNKNOWN_APP_TITLE = 'Unknown Application'
+
+	def __init__(self, classname_index, application_delimiter, classname_index_exceptions, app_title_mappings, cache_size=None):
+		self.classname_index = classname_index
+		self.application_delimiter = application_delimiter
+		self.app_title_mappings = app_title_mappings
+		# (index, classname) -> (position, application); the position keeps the first matching exception in config
+		# order winning, as it did when the exceptions were scanned one by one.
+		self.exceptions = {}
+		for position, exception in enumerate(classname_index_exceptions):
+			key = (int(exception['index']), exception['classname'])
+			if key not in self.exceptions:
+				self.exceptions[key] = (position, exception['application'])
+		self.exception_indexes = sorted(set(index for index, classname in self.exceptions))
+		self.resolve = lru_cache(maxsize=cache_size or ApplicationResolver.DEFAULT_CACHE_SIZE)(self._resolve)
+
+	def app_title(self, application):
+		return self.app_title_mappings.get(application, ApplicationResolver.UNKNOWN_APP_TITLE)
+
+	def _resolve(self, class_name):
+		# Returns (is_parsable, application, app_title, failure_url_path) where failure_url_path is the part of a
+		# failure URL that comes from the className, ready for the case name to be appended.
+		class_name_parts = class_name.split('.')
+		failure_url_path = '.'.join(class_name_parts[:-1]) + '/' + class_name_parts[-1] + '/'
+		if len(class_name_parts) <= self.classname_index:
+			return False, None, None, failure_url_path
+		application = self._exception_application(class_name_parts)
+		if not application:
+			application = class_name_parts[self.classname_index]
+			if self.application_delimiter and self.application_delimiter in application:
+				application = application.split(self.application_delimiter)[1]
+		return True, application, self.app_title(application), failure_url_path
+
+	def _exception_application(self, class_name_parts):
+		match = None
+		for index in self.exception_indexes:
+			if len(class_name_parts) > index:
+				exception = self.exceptions.get((index, class_name_parts[index]))
+				if exception and (match is None or exception[0] < match[0]):
+					match = exception
+		return match[1] if match else None
\ No newline at end of file
@@ -1,26 +1,42 @@
-from openpyxl.styles import PatternFill, Font, Border, Side
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import PatternFill, Font, Border, Side, NamedStyle
+from openpyxl.styles.borders import DEFAULT_BORDER
 from openpyxl.formatting.rule import CellIsRule
+from openpyxl.utils import get_column_letter
 import os.path
 
+from output_backends import ExcelBackend
+from result_records import Link
+from run_metrics import RunMetrics
+
 class WorkbookManager:
-	def __init__(self, workbook, percentage_formatting):
+	def __init__(self, workbook, percentage_formatting, metrics=None):
 		self.workbook = workbook
 		self.percentage_formatting = percentage_formatting
+		self.metrics = metrics or RunMetrics()
+		self.is_streaming = getattr(workbook, 'write_only', False)
+		self.named_styles = NamedStyles(workbook)
 
 	def write_results_to_worksheet(self, test_results, sheet_name, is_new_sheet=False, table_name=None,
 		table_title=None, is_failures_reported=True, is_main_sheet=False):
+		with self.metrics.timed('workbook_write', sheet_name):
+			self._write_results_to_worksheet(test_results, sheet_name, is_new_sheet, table_name, table_title,
+				is_failures_reported, is_main_sheet)
+
+	def _write_results_to_worksheet(self, test_results, sheet_name, is_new_sheet, table_name, table_title,
+		is_failures_reported, is_main_sheet):
 		worksheet = self.workbook.active
-		if is_new_sheet:
+		if is_new_sheet or self.is_streaming:
 			wb = self.workbook
 			if is_main_sheet:
 				worksheet = wb.create_sheet(index=0)
 			else:
 				worksheet = wb.create_sheet()
 		worksheet.title = sheet_name
+		excel_mgr = self._worksheet_manager(worksheet)
 
 		starting_row = ResultsTable.STARTING_ROW
 		if table_title:
-			excel_mgr = WorksheetManager(worksheet)
 			excel_mgr.paint_cell(starting_row, FailureList.COLUMN, table_title, is_bold=True, font_size=14)
 			starting_row += 2
 
@@ -28,38 +44,61 @@ class WorkbookManager:
 		table = ResultsTable(results_table_name, self.percentage_formatting, starting_row=starting_row)
 		for result in test_results:
 			table.add_result(result['app_title'], result['number_passing'], result['number_failing'])
-		next_row = table.write_results(worksheet, is_main_sheet) + 1
+		next_row = table.write_results(excel_mgr, is_main_sheet) + 1
 
 		if is_failures_reported:
-			self._write_failures_to_worksheet(worksheet, next_row, test_results)
+			self._write_failures_to_worksheet(excel_mgr, next_row, test_results)
+		excel_mgr.flush()
+
+	def write_flaky_tests_to_worksheet(self, flaky_tests, sheet_name=None):
+		sheet_name = sheet_name or FlakyTestsTable.SHEET_NAME
+		with self.metrics.timed('workbook_write', sheet_name):
+			worksheet = self.workbook.create_sheet()
+			worksheet.title = sheet_name
+			excel_mgr = self._worksheet_manager(worksheet)
+			FlakyTestsTable(flaky_tests, self.percentage_formatting).write_results(excel_mgr)
+			excel_mgr.flush()
+
+	def _worksheet_manager(self, worksheet):
+		if self.is_streaming:
+			return StreamingWorksheetManager(worksheet, self.named_styles)
+		return WorksheetManager(worksheet, self.named_styles)
 
-	def save_workbook(self):
-		default_filename = 'regression_run'
-		filename = input('Enter filename (\'' + default_filename + '\'): ') or default_filename
-		extension = '.xlsx'
-		filename = filename.replace(extension, '') + extension
+	def save_workbook(self, filename=None, is_overwriting=False, is_interactive=True):
+		# Without a terminal (batch runs) nothing is asked: the filename falls back to the default and an existing file
+		# is only replaced when overwriting was requested.
+		if not filename:
+			filename = input('Enter filename (\'' + ExcelBackend.DEFAULT_FILENAME + '\'): ') if is_interactive else None
+		filename = ExcelBackend.workbook_filename(filename)
 
 		is_saving = True
-		if os.path.isfile(filename):
-			user_input = input('\'' + filename + '\' already exists. Would you like to overwrite it (Y/N)? ')
-			is_saving = (user_input in ['Y', 'y', 'Yes', 'YES', 'yes'])
+		if os.path.isfile(filename) and not is_overwriting:
+			if is_interactive:
+				user_input = input('\'' + filename + '\' already exists. Would you like to overwrite it (Y/N)? ')
+				is_saving = (user_input in ['Y', 'y', 'Yes', 'YES', 'yes'])
+			else:
+				raise Exception('\'' + filename + '\' already exists; pass --overwrite to replace it')
 		if is_saving:
 			print('Saving \'' + filename + '\'...')
-			self.workbook.save(filename=(filename))
+			with self.metrics.timed('workbook_save'):
+				self.workbook.save(filename=(filename))
 			print('Saved')
+		return filename if is_saving else None
 
-	def _write_failures_to_worksheet(self, worksheet, next_row, test_results):
-		excel_mgr = WorksheetManager(worksheet)
+	def _write_failures_to_worksheet(self, excel_mgr, next_row, test_results):
 		excel_mgr.paint_cell(next_row, FailureList.COLUMN, 'Failures', is_bold=True, is_underline=True, font_size=14)
 		next_row += 1
 
 		for result in test_results:
 				failures = FailureList(result['app_title'], result['failure_links'], self.percentage_formatting)
-				next_row = failures.write_results(worksheet, next_row + 1)
+				next_row = failures.write_results(excel_mgr, next_row + 1)
 
 class WorksheetManager:
-	def __init__(self, worksheet):
+	# Columns are 1-based indexes, as in openpyxl. Each cell is looked up once and styled with a single shared named
+	# style instead of its own Font, PatternFill and Border.
+	def __init__(self, worksheet, named_styles=None):
 		self.worksheet = worksheet
+		self.named_styles = named_styles or NamedStyles(worksheet.parent)
 
 	@staticmethod
 	def fill_from_hex_value(hex_value):
@@ -67,28 +106,85 @@ class WorksheetManager:
 
 	def paint_cell(self, row, col, text, fill_color=None, is_bold=False, is_italic=False, is_underline=False, 
 		font_size=12, border=None, is_percent=False, font_color='000000'):
-		cell_location = chr(col) + str(row)
-		self.worksheet[cell_location] = text
-		if fill_color:
-			self.worksheet[cell_location].fill = WorksheetManager.fill_from_hex_value(fill_color)
-		if border:
-			self.worksheet[cell_location].border = border
-		if is_percent:
-			self.worksheet[cell_location].number_format = '0%'
-		underline_value = 'single' if is_underline else None
-		self.worksheet[cell_location].font = Font(bold=is_bold, italic=is_italic, underline=underline_value, size=font_size, color=font_color)
+		cell = self._cell(row, col, text)
+		cell.style = self.named_styles.style_name(fill_color=fill_color, is_bold=is_bold, is_italic=is_italic,
+			is_underline=is_underline, font_size=font_size, border=border, is_percent=is_percent, font_color=font_color)
 
 	def paint_hyperlink(self, row, col, link, border=None, font_size=12):
-		cell_location = chr(col) + str(row)
-		self.worksheet[cell_location] = link['value']
-		self.worksheet[cell_location].hyperlink = link['url']
-		self.worksheet[cell_location].font = Font(underline='single', color='0563C1', size=font_size)
-		if border:
-			self.worksheet[cell_location].border = border
+		cell = self._cell(row, col, link.value)
+		cell.hyperlink = link.url
+		cell.style = self.named_styles.style_name(is_underline=True, font_size=font_size, border=border,
+			font_color=NamedStyles.HYPERLINK_COLOR)
+
+	def flush(self):
+		pass
+
+	def _cell(self, row, col, value):
+		return self.worksheet.cell(row=row, column=col, value=value)
+
+class StreamingWorksheetManager(WorksheetManager):
+	# Write-only worksheets only accept whole rows, in order, so the cells of the row being painted are buffered and
+	# appended once a later row is painted.
+	def __init__(self, worksheet, named_styles):
+		super(StreamingWorksheetManager, self).__init__(worksheet, named_styles)
+		self._row = None
+		self._rows_written = 0
+		self._cells = {}
+
+	def flush(self):
+		if self._cells:
+			while self._rows_written < self._row - 1:
+				self.worksheet.append([])
+				self._rows_written += 1
+			self.worksheet.append([self._cells.get(column) for column in range(1, max(self._cells) + 1)])
+			self._rows_written += 1
+			self._cells = {}
+
+	def _cell(self, row, col, value):
+		if self._row is not None and row < self._row:
+			raise Exception('Cannot paint row ' + str(row) + ' after row ' + str(self._row) + ' of a write-only worksheet')
+		if row != self._row:
+			self.flush()
+			self._row = row
+		cell = WriteOnlyCell(self.worksheet, value=value)
+		self._cells[col] = cell
+		return cell
+
+class NamedStyles:
+	# One NamedStyle per distinct combination of cell formatting, registered with the workbook the first time it is
+	# painted and shared by every later cell that looks the same.
+	HYPERLINK_COLOR = '0563C1'
+	STYLE_NAME_PREFIX = 'Regression '
+
+	def __init__(self, workbook):
+		self.workbook = workbook
+		self.style_names = {}
+
+	def style_name(self, fill_color=None, is_bold=False, is_italic=False, is_underline=False, font_size=12, border=None,
+		is_percent=False, font_color='000000'):
+		key = (fill_color, is_bold, is_italic, is_underline, font_size, id(border) if border else None, is_percent, font_color)
+		if key not in self.style_names:
+			style = NamedStyle(name=self._unused_name())
+			style.font = Font(bold=is_bold, italic=is_italic, underline='single' if is_underline else None, size=font_size,
+				color=font_color)
+			if fill_color:
+				style.fill = WorksheetManager.fill_from_hex_value(fill_color)
+			style.border = border or DEFAULT_BORDER
+			if is_percent:
+				style.number_format = '0%'
+			self.workbook.add_named_style(style)
+			self.style_names[key] = style.name
+		return self.style_names[key]
+
+	def _unused_name(self):
+		number = len(self.style_names) + 1
+		while (NamedStyles.STYLE_NAME_PREFIX + str(number)) in self.workbook.named_styles:
+			number += 1
+		return NamedStyles.STYLE_NAME_PREFIX + str(number)
 
 class ResultsTable:
 	STARTING_ROW = 2
-	STARTING_COL = 66
+	STARTING_COL = 2
 	BORDER = Border(left=Side(style='thin',color='000000'),
 		right=Side(style='thin',color='000000'),
 		top=Side(style='thin',color='000000'),
@@ -109,20 +205,23 @@ class ResultsTable:
 	def add_result(self, app_name, passCount, failCount):
 		self.results.append({'app_name': app_name, 'passCount': passCount, 'failCount': failCount})
 
-	def write_results(self, worksheet, is_apps_linked=False):
+	def write_results(self, excel_mgr, is_apps_linked=False):
 		headerFill = 'A9D08E'
 		totalFill = 'E7E6E6'
+		worksheet = excel_mgr.worksheet
 
-		percent_col = chr(self.STARTING_COL + 4)
-		avg_col = chr(ResultsTable.STARTING_COL + 5)
+		percent_col = get_column_letter(self.STARTING_COL + 4)
+		avg_col = get_column_letter(ResultsTable.STARTING_COL + 5)
 		ending_row = str(self.starting_row + len(self.results) + 1)
 		format_range = percent_col + str(self.starting_row + 1) + ':' + percent_col + ending_row 
 		self.add_status_formatting_to_range(worksheet, format_range)
-		excel_mgr = WorksheetManager(worksheet)
+		# Column widths go first: write-only worksheets write them out before the first row.
+		worksheet.column_dimensions[get_column_letter(ResultsTable.STARTING_COL)].width = 35
+		worksheet.column_dimensions[percent_col].width = 20
+		worksheet.column_dimensions[avg_col].width = 15
 
 		row = self.starting_row
 		col = ResultsTable.STARTING_COL
-		worksheet.column_dimensions[chr(col)].width = 35
 		excel_mgr.paint_cell(row, col, self.job_name, fill_color=headerFill, font_size=14, border=ResultsTable.BORDER)
 		col += 1
 		excel_mgr.paint_cell(row, col, 'Total', fill_color=headerFill, font_size=14, border=ResultsTable.BORDER)
@@ -131,7 +230,6 @@ class ResultsTable:
 		col += 1
 		excel_mgr.paint_cell(row, col, 'Failing', fill_color=headerFill, font_size=14, border=ResultsTable.BORDER)
 		col += 1
-		worksheet.column_dimensions[chr(col)].width = 20
 		excel_mgr.paint_cell(row, col, 'Percent Passing', fill_color=headerFill, font_size=14, border=ResultsTable.BORDER)
 
 		col = ResultsTable.STARTING_COL
@@ -152,27 +250,26 @@ class ResultsTable:
 			col = ResultsTable.STARTING_COL
 
 		totalFill = 'E7E6E6'
+		excel_mgr.paint_cell(row-1, ResultsTable.STARTING_COL + 5, 'Avg. % Pass', fill_color='000000', font_color='FFFFFF', is_bold=True)
 		excel_mgr.paint_cell(row, col, 'TOTAL', fill_color=totalFill, is_bold=True, border=ResultsTable.BORDER)
 		for i in range(0,3):
 			col += 1
-			cell_range = chr(col) + str(starting_row) + ':' + chr(col) + str(row-1)
+			cell_range = get_column_letter(col) + str(starting_row) + ':' + get_column_letter(col) + str(row-1)
 			excel_mgr.paint_cell(row, col, '=SUM(' + cell_range + ')', fill_color=totalFill, is_bold=True, border=ResultsTable.BORDER)
-		percentage_passed_formula = '=' + chr(col-1) + str(row) + '/' + chr(col-2) + str(row)
+		percentage_passed_formula = '=' + get_column_letter(col-1) + str(row) + '/' + get_column_letter(col-2) + str(row)
 		excel_mgr.paint_cell(row, col+1, percentage_passed_formula, border=ResultsTable.BORDER, is_percent=True)
 
-		formula_range = chr(col+1) + str(starting_row) + ':' + chr(col+1) + str(row-1)
+		formula_range = get_column_letter(col+1) + str(starting_row) + ':' + get_column_letter(col+1) + str(row-1)
 		avg_passed_formula = '=AVERAGE(' + formula_range + ')'
 		stdev_passed_formula = '=STDEV.P(' + formula_range + ')'
-		excel_mgr.paint_cell(row-1, col+2, 'Avg. % Pass', fill_color='000000', font_color='FFFFFF', is_bold=True)
 		excel_mgr.paint_cell(row, col+2, avg_passed_formula, border=ResultsTable.BORDER, is_percent=True)
-		self.add_status_formatting_to_range(worksheet, (chr(col+2) + str(row) + ':' + chr(col+2) +str(row)))
-		worksheet.column_dimensions[chr(col+2)].width = 15
+		self.add_status_formatting_to_range(worksheet, (get_column_letter(col+2) + str(row) + ':' + get_column_letter(col+2) +str(row)))
 
 		return row + 1
 
 	def _paint_app_name(self, excel_mgr, row, col, is_apps_linked, app_name):
 		if is_apps_linked:
-			link = { 'value': app_name, 'url': '#\'' + app_name + '\'!B2' }
+			link = Link(app_name, '#\'' + app_name + '\'!B2')
 			excel_mgr.paint_hyperlink(row, col, link, border=ResultsTable.BORDER)
 		else:
 			excel_mgr.paint_cell(row, col, app_name, font_size=14, border=ResultsTable.BORDER)
@@ -185,8 +282,7 @@ class FailureList:
 		self.failures = failures
 		self.percentage_formatting = percentage_formatting
 
-	def write_results(self, worksheet, row_number):
-		excel_mgr = WorksheetManager(worksheet)
+	def write_results(self, excel_mgr, row_number):
 		excel_mgr.paint_cell(row_number, FailureList.COLUMN, self.app_name)
 		row = row_number + 1
 		if len(self.failures) == 0:
@@ -199,4 +295,46 @@ class FailureList:
 			for link in self.failures:
 				excel_mgr.paint_hyperlink(row, FailureList.COLUMN, link)
 				row += 1
-		return row
\ No newline at end of file
+		return row
+
+class FlakyTestsTable:
+	SHEET_NAME = 'Flaky Tests'
+	HEADERS = ['Application', 'Test', 'Runs', 'Percent Passing', 'Flips', 'Failure Streak', 'Longest Streak', 'Latest Failure']
+	COLUMN_WIDTHS = [25, 50, 8, 18, 8, 16, 16, 50]
+
+	def __init__(self, flaky_tests, percentage_formatting):
+		self.flaky_tests = flaky_tests
+		self.percentage_formatting = percentage_formatting
+
+	def write_results(self, excel_mgr):
+		headerFill = 'A9D08E'
+		for index, width in enumerate(FlakyTestsTable.COLUMN_WIDTHS):
+			excel_mgr.worksheet.column_dimensions[get_column_letter(ResultsTable.STARTING_COL + index)].width = width
+
+		row = ResultsTable.STARTING_ROW
+		excel_mgr.paint_cell(row, ResultsTable.STARTING_COL, 'Flaky Tests', is_bold=True, font_size=14)
+		row += 2
+		for index, header in enumerate(FlakyTestsTable.HEADERS):
+			excel_mgr.paint_cell(row, ResultsTable.STARTING_COL + index, header, fill_color=headerFill, font_size=14,
+				border=ResultsTable.BORDER)
+		row += 1
+
+		if len(self.flaky_tests) == 0:
+			success_font = self.percentage_formatting['success']['font_color']
+			success_fill = self.percentage_formatting['success']['fill_color']
+			excel_mgr.paint_cell(row, ResultsTable.STARTING_COL, 'No Flaky Tests', is_italic=True, fill_color=success_fill,
+				font_color=success_font)
+			return row + 1
+
+		for app_title, stats in self.flaky_tests:
+			col = ResultsTable.STARTING_COL
+			values = [app_title, stats.case_name, stats.runs, stats.pass_rate(), stats.flips, stats.failure_streak,
+				stats.longest_failure_streak]
+			for index, value in enumerate(values):
+				excel_mgr.paint_cell(row, col + index, value, border=ResultsTable.BORDER, is_percent=(index == 3))
+			if stats.failure_link:
+				excel_mgr.paint_hyperlink(row, col + len(values), stats.failure_link, border=ResultsTable.BORDER)
+			else:
+				excel_mgr.paint_cell(row, col + len(values), '', border=ResultsTable.BORDER)
+			row += 1
+		return row
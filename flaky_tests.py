@@ -0,0 +1,104 @@
+from array import array
+
+from result_records import FailureLink
+
+class FlakyTestStats:
+	# Running totals for one test case, updated once per build in build-number order. The status of every build behind
+	# them is kept too, as the build number (negated for a failure), so that the totals can be rebuilt over the current
+	# window once older builds have left it.
+	__slots__ = ['case_name', 'statuses', 'runs', 'passes', 'flips', 'last_passing', 'failure_streak', 'longest_failure_streak',
+		'failure_link']
+
+	def __init__(self, case_name):
+		self.case_name = case_name
+		self.statuses = array('l')
+		self.runs = 0
+		self.passes = 0
+		self.flips = 0
+		self.last_passing = None
+		self.failure_streak = 0
+		self.longest_failure_streak = 0
+		self.failure_link = None
+
+	def add(self, build_number, is_passing, failure_link):
+		self.statuses.append(build_number if is_passing else -build_number)
+		self.runs += 1
+		if is_passing:
+			self.passes += 1
+			self.failure_streak = 0
+		else:
+			self.failure_streak += 1
+			self.longest_failure_streak = max(self.longest_failure_streak, self.failure_streak)
+			self.failure_link = failure_link or self.failure_link
+		if self.last_passing is not None and self.last_passing != is_passing:
+			self.flips += 1
+		self.last_passing = is_passing
+
+	def trim(self, first_build_number):
+		# Drops the builds before first_build_number and recounts the rest. The failure link is that of the latest
+		# failure, so it only goes when no failure is left.
+		first_index = 0
+		while first_index < len(self.statuses) and abs(self.statuses[first_index]) < first_build_number:
+			first_index += 1
+		if first_index:
+			statuses = self.statuses[first_index:]
+			failure_link = self.failure_link if any(status < 0 for status in statuses) else None
+			self.__init__(self.case_name)
+			for status in statuses:
+				self.add(abs(status), status > 0, None)
+			self.failure_link = failure_link
+
+	def pass_rate(self):
+		return float(self.passes) / self.runs if self.runs else 0.0
+
+	def to_dict(self):
+		return { 'case_name': self.case_name, 'statuses': self.statuses.tolist(),
+			'failure_link': self.failure_link.to_dict() if self.failure_link else None }
+
+	@staticmethod
+	def from_dict(data):
+		stats = FlakyTestStats(data['case_name'])
+		for status in data['statuses']:
+			stats.add(abs(status), status > 0, None)
+		stats.failure_link = FailureLink.from_dict(data['failure_link'])
+		return stats
+
+class FlakinessTracker:
+	# Flip counts, failure streaks and pass rates for every test case of a job, built up while builds are folded, so
+	# the history is never fetched or scanned again. A test counts as flaky once its status has changed MIN_FLIPS times;
+	# a single flip is just a test that broke or was fixed.
+	MIN_FLIPS = 2
+
+	def __init__(self):
+		self.stats = {}
+
+	def add_case(self, case_name, build_number, is_passing, failure_link):
+		stats = self.stats.get(case_name)
+		if stats is None:
+			stats = self.stats[case_name] = FlakyTestStats(case_name)
+		stats.add(build_number, is_passing, failure_link)
+
+	def trim(self, first_build_number):
+		# Called with the start of the reporting window when the tracker comes back from a snapshot, so the totals are
+		# the same as if only the window had been folded.
+		for case_name, stats in list(self.stats.items()):
+			stats.trim(first_build_number)
+			if not stats.runs:
+				del self.stats[case_name]
+
+	def flaky_tests(self):
+		flaky_tests = [stats for stats in self.stats.values() if stats.flips >= FlakinessTracker.MIN_FLIPS]
+		return sorted(flaky_tests, key=lambda stats: (-stats.flips, stats.pass_rate(), stats.case_name))
+
+	def to_dict(self):
+		return [stats.to_dict() for stats in self.stats.values()]
+
+	@staticmethod
+	def from_dict(data):
+		if isinstance(data, FlakinessTracker):
+			return data
+		tracker = FlakinessTracker()
+		for stats_data in (data or []):
+			stats = FlakyTestStats.from_dict(stats_data)
+			tracker.stats[stats.case_name] = stats
+		return tracker
@@ -0,0 +1,150 @@
+import http.client
+import threading
+import time
+from urllib.error import HTTPError
+from urllib.parse import urljoin, urlsplit
+
+class HttpConnectionPool:
+	DEFAULT_MAX_CONNECTIONS_PER_HOST = 8
+	DEFAULT_TIMEOUT = 60.0
+	DEFAULT_MAX_RETRIES = 3
+	DEFAULT_BACKOFF_SECONDS = 0.5
+	RETRY_STATUS_CODES = [500, 502, 503, 504]
+	REDIRECT_STATUS_CODES = [301, 302, 303, 307, 308]
+	MAX_REDIRECTS = 5
+	RETRY_EXCEPTIONS = (ConnectionError, http.client.RemoteDisconnected, http.client.BadStatusLine, TimeoutError)
+
+	def __init__(self, max_connections_per_host=None, timeout=None, max_retries=None, backoff_seconds=None,
+		max_requests_in_flight=None):
+		self.max_connections_per_host = int(max_connections_per_host or HttpConnectionPool.DEFAULT_MAX_CONNECTIONS_PER_HOST)
+		self.timeout = float(timeout or HttpConnectionPool.DEFAULT_TIMEOUT)
+		self.max_retries = int(max_retries if max_retries is not None else HttpConnectionPool.DEFAULT_MAX_RETRIES)
+		self.backoff_seconds = float(backoff_seconds if backoff_seconds is not None else HttpConnectionPool.DEFAULT_BACKOFF_SECONDS)
+		self.connections_opened = 0
+		self.connections_reused = 0
+		self.retries = 0
+		self._idle_connections = {}
+		self._host_slots = {}
+		self._request_slot = threading.BoundedSemaphore(int(max_requests_in_flight)) if max_requests_in_flight else None
+		self._lock = threading.Lock()
+
+	def open(self, url, headers=None, redirects=0):
+		# Returns a PooledResponse that must be closed (or used as a context manager) so its connection can go back
+		# to the pool. Connection resets, timeouts and 5xx responses are retried with exponential backoff, and redirects
+		# (e.g. http to https behind a proxy) are followed up to MAX_REDIRECTS times. Requests wait for a slot on their
+		# host and, when max_requests_in_flight is set, for one of the slots shared by every host.
+		parts = urlsplit(url)
+		host_key = (parts.scheme, parts.netloc)
+		path = parts.path + ('?' + parts.query if parts.query else '')
+		slot = RequestSlots([self._request_slot, self._host_slot(host_key)])
+		slot.acquire()
+		attempt = 0
+		while True:
+			connection, is_reused = self._checkout(host_key)
+			try:
+				connection.request('GET', path, headers=headers or {})
+				response = connection.getresponse()
+			except HttpConnectionPool.RETRY_EXCEPTIONS:
+				connection.close()
+				if is_reused:
+					# Idle keep-alive connections are routinely closed by the server; retry those straight away.
+					continue
+				if attempt >= self.max_retries:
+					slot.release()
+					raise
+			except:
+				connection.close()
+				slot.release()
+				raise
+			else:
+				if response.status < 300:
+					return PooledResponse(self, host_key, connection, response, slot)
+				response.read()
+				if response.status in HttpConnectionPool.REDIRECT_STATUS_CODES:
+					self._checkin(host_key, connection, response)
+					slot.release()
+					location = response.headers.get('Location')
+					if not location or redirects >= HttpConnectionPool.MAX_REDIRECTS:
+						raise HTTPError(url, response.status, ('Too many redirects' if location else 'Redirect without a Location') +
+							' (' + response.reason + ')', response.headers, None)
+					return self.open(urljoin(url, location), headers, redirects + 1)
+				if response.status not in HttpConnectionPool.RETRY_STATUS_CODES or attempt >= self.max_retries:
+					self._checkin(host_key, connection, response)
+					slot.release()
+					raise HTTPError(url, response.status, response.reason, response.headers, None)
+				self._checkin(host_key, connection, response)
+			attempt += 1
+			with self._lock:
+				self.retries += 1
+			time.sleep(self.backoff_seconds * (2 ** (attempt - 1)))
+
+	def close(self):
+		with self._lock:
+			for connections in self._idle_connections.values():
+				for connection in connections:
+					connection.close()
+			self._idle_connections = {}
+
+	def _host_slot(self, host_key):
+		with self._lock:
+			if host_key not in self._host_slots:
+				self._host_slots[host_key] = threading.BoundedSemaphore(self.max_connections_per_host)
+			return self._host_slots[host_key]
+
+	def _checkout(self, host_key):
+		with self._lock:
+			idle_connections = self._idle_connections.get(host_key)
+			if idle_connections:
+				self.connections_reused += 1
+				return idle_connections.pop(), True
+			self.connections_opened += 1
+		scheme, netloc = host_key
+		connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+		return connection_class(netloc, timeout=self.timeout), False
+
+	def _checkin(self, host_key, connection, response):
+		if response.will_close:
+			connection.close()
+		else:
+			with self._lock:
+				self._idle_connections.setdefault(host_key, []).append(connection)
+
+class RequestSlots:
+	def __init__(self, semaphores):
+		self.semaphores = [semaphore for semaphore in semaphores if semaphore is not None]
+
+	def acquire(self):
+		for semaphore in self.semaphores:
+			semaphore.acquire()
+
+	def release(self):
+		for semaphore in reversed(self.semaphores):
+			semaphore.release()
+
+class PooledResponse:
+	def __init__(self, pool, host_key, connection, response, slot):
+		self.pool = pool
+		self.status = response.status
+		self.headers = response.headers
+		self._host_key = host_key
+		self._connection = connection
+		self._response = response
+		self._slot = slot
+
+	def read(self, amount=None):
+		return self._response.read(amount)
+
+	def close(self):
+		if self._connection:
+			if self._response.isclosed():
+				self.pool._checkin(self._host_key, self._connection, self._response)
+			else:
+				self._connection.close()
+			self._connection = None
+			self._slot.release()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
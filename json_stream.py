@@ -0,0 +1,127 @@
+import codecs
+import json
+
+class JsonStreamReader:
+	CHUNK_SIZE = 64 * 1024
+	WHITESPACE = ' \t\n\r'
+	NUMBER_CHARS = '0123456789+-.eE'
+
+	def __init__(self, stream, chunk_size=None):
+		self.stream = stream
+		self.chunk_size = chunk_size or JsonStreamReader.CHUNK_SIZE
+		self._decoder = json.JSONDecoder()
+		self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+		self._buffer = ''
+		self._position = 0
+		self._is_exhausted = False
+
+	def iter_values(self, streamed_path):
+		# Yields (path, value) pairs from a JSON document without loading the whole document. Objects and arrays
+		# along streamed_path are walked one member at a time, so only a single element at the end of the path
+		# (or a single value beside it) is ever decoded at once. Paths are tuples of object keys and array indexes;
+		# None in streamed_path matches any array index.
+		self._skip_whitespace()
+		for path_value in self._walk((), streamed_path):
+			yield path_value
+
+	@staticmethod
+	def matches_path(path, streamed_path):
+		if len(path) != len(streamed_path):
+			return False
+		for index, key in enumerate(streamed_path):
+			if key is not None and path[index] != key:
+				return False
+		return True
+
+	def _walk(self, path, streamed_path):
+		char = self._peek()
+		is_on_path = (len(path) < len(streamed_path) and JsonStreamReader.matches_path(path, streamed_path[:len(path)]))
+		if is_on_path and char == '{':
+			for path_value in self._walk_object(path, streamed_path):
+				yield path_value
+		elif is_on_path and char == '[':
+			for path_value in self._walk_array(path, streamed_path):
+				yield path_value
+		else:
+			yield path, self._decode_value()
+
+	def _walk_object(self, path, streamed_path):
+		self._position += 1
+		self._skip_whitespace()
+		if self._peek() == '}':
+			self._position += 1
+			return
+		while True:
+			key = self._decode_value()
+			self._skip_whitespace()
+			self._expect(':')
+			self._skip_whitespace()
+			for path_value in self._walk(path + (key,), streamed_path):
+				yield path_value
+			self._skip_whitespace()
+			if self._expect(',}') == '}':
+				return
+			self._skip_whitespace()
+
+	def _walk_array(self, path, streamed_path):
+		self._position += 1
+		self._skip_whitespace()
+		if self._peek() == ']':
+			self._position += 1
+			return
+		index = 0
+		while True:
+			for path_value in self._walk(path + (index,), streamed_path):
+				yield path_value
+			index += 1
+			self._skip_whitespace()
+			if self._expect(',]') == ']':
+				return
+			self._skip_whitespace()
+
+	def _decode_value(self):
+		while True:
+			try:
+				value, end = self._decoder.raw_decode(self._buffer, self._position)
+			except json.JSONDecodeError:
+				if not self._fill():
+					raise
+			else:
+				# A number that runs up to the end of the buffer (or up to a '.' or exponent) may continue in the next chunk.
+				is_truncated = (end == len(self._buffer) or self._buffer[end] in JsonStreamReader.NUMBER_CHARS)
+				if not is_truncated or not self._fill():
+					self._position = end
+					return value
+
+	def _expect(self, expected_chars):
+		char = self._peek()
+		if not char or char not in expected_chars:
+			raise ValueError('Expected one of \'' + expected_chars + '\' at position ' + str(self._position) +
+				' of JSON stream but found \'' + char + '\'')
+		self._position += 1
+		return char
+
+	def _peek(self):
+		while self._position >= len(self._buffer):
+			if not self._fill():
+				return ''
+		return self._buffer[self._position]
+
+	def _skip_whitespace(self):
+		char = self._peek()
+		while char and char in JsonStreamReader.WHITESPACE:
+			self._position += 1
+			char = self._peek()
+
+	def _fill(self):
+		if self._is_exhausted:
+			return False
+		chunk = self.stream.read(self.chunk_size)
+		if chunk:
+			text = self._text_decoder.decode(chunk)
+		else:
+			text = self._text_decoder.decode(b'', final=True)
+			self._is_exhausted = True
+		self._buffer = self._buffer[self._position:] + text
+		self._position = 0
+		return bool(chunk) or bool(text)
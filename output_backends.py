@@ -0,0 +1,268 @@
+import csv
+import json
+import struct
+import sys
+import threading
+import zlib
+from array import array
+
+class ResultsBackend:
+	# Opened once before anything is fetched, then receives every build BuildResultsService fetches (add_build) and
+	# the aggregated rows of every sheet (write_results), and is saved once at the end of the run. Builds can arrive from several threads at once.
+	#
+	# Raw results are flattened into three tables: one row per build, one row per test case of a build (for jobs
+	# parsed with ApplicationNameParser only their failures are known, so those become failing case rows) and one row
+	# per aggregated sheet line.
+	BUILD_COLUMNS = [('view', 'str'), ('job', 'str'), ('build_number', 'int'), ('app_title', 'str'), ('number_passing', 'int'),
+		('number_failing', 'int'), ('timestamp', 'int')]
+	CASE_COLUMNS = [('view', 'str'), ('job', 'str'), ('build_number', 'int'), ('app_title', 'str'), ('case_name', 'str'),
+		('is_passing', 'bool'), ('failure_url', 'str')]
+	SUMMARY_COLUMNS = [('sheet', 'str'), ('app_title', 'str'), ('number_passing', 'int'), ('number_failing', 'int')]
+
+	def __init__(self):
+		self._lock = threading.Lock()
+
+	def filenames(self):
+		return []
+
+	def open(self):
+		pass
+
+	def add_build(self, job_config, job, result):
+		build_row = ResultsBackend.build_row(job_config, job, result)
+		case_rows = ResultsBackend.case_rows(job_config, job, result)
+		with self._lock:
+			self.write_build_rows(build_row, case_rows)
+
+	def write_results(self, results, sheet_title, is_new_sheet=False, **options):
+		summary_rows = [(sheet_title, result['app_title'], result['number_passing'], result['number_failing']) for result in results]
+		with self._lock:
+			self.write_summary_rows(summary_rows)
+
+	def write_flaky_tests(self, flaky_tests):
+		# flaky_tests is a list of (app_title, FlakyTestStats).
+		pass
+
+	def write_build_rows(self, build_row, case_rows):
+		pass
+
+	def write_summary_rows(self, summary_rows):
+		pass
+
+	def save(self):
+		pass
+
+	@staticmethod
+	def build_row(job_config, job, result):
+		return (job_config.view_name, job, result.build_number, result.app_title, result.number_passing, result.number_failing,
+			result.timestamp)
+
+	@staticmethod
+	def case_rows(job_config, job, result):
+		row_prefix = (job_config.view_name, job, result.build_number, result.app_title)
+		if result.test_cases:
+			return [row_prefix + (case.case_name, case.is_passing, case.failure_link.url if case.failure_link else None)
+				for case in result.test_cases]
+		return [row_prefix + (link.value, False, link.url) for link in result.failure_links]
+
+	@staticmethod
+	def column_names(columns):
+		return [name for name, kind in columns]
+
+class ExcelBackend(ResultsBackend):
+	# The workbook report as an output backend. It only needs the aggregated rows of each sheet, so raw builds are
+	# ignored. openpyxl is only imported when the first sheet is written.
+	DEFAULT_FILENAME = 'regression_run'
+	EXTENSION = '.xlsx'
+
+	def __init__(self, percentage_formatting, filename=None, is_overwriting=False, is_interactive=True, is_write_only=False,
+		metrics=None):
+		ResultsBackend.__init__(self)
+		self.percentage_formatting = percentage_formatting
+		self.filename = filename
+		self.is_overwriting = is_overwriting
+		self.is_interactive = is_interactive
+		self.is_write_only = is_write_only
+		self.metrics = metrics
+		self.workbook_manager = None
+
+	def filenames(self):
+		return [ExcelBackend.workbook_filename(self.filename)]
+
+	def add_build(self, job_config, job, result):
+		pass
+
+	def write_results(self, results, sheet_title, is_new_sheet=False, **options):
+		self._workbook_manager().write_results_to_worksheet(results, sheet_title, is_new_sheet, **options)
+
+	def write_flaky_tests(self, flaky_tests):
+		self._workbook_manager().write_flaky_tests_to_worksheet(flaky_tests)
+
+	def save(self):
+		self._workbook_manager().save_workbook(self.filename, self.is_overwriting, self.is_interactive)
+
+	def _workbook_manager(self):
+		if not self.workbook_manager:
+			from openpyxl import Workbook
+			from excel_reporting import WorkbookManager
+			self.workbook_manager = WorkbookManager(Workbook(write_only=self.is_write_only), self.percentage_formatting, self.metrics)
+		return self.workbook_manager
+
+	@staticmethod
+	def workbook_filename(filename=None):
+		filename = filename or ExcelBackend.DEFAULT_FILENAME
+		return filename.replace(ExcelBackend.EXTENSION, '') + ExcelBackend.EXTENSION
+
+class JsonLinesBackend(ResultsBackend):
+	# One JSON object per line, written as builds arrive; the 'record' field tells builds, cases and summary rows apart.
+	EXTENSION = '.jsonl'
+
+	def __init__(self, base_filename):
+		ResultsBackend.__init__(self)
+		self.filename = base_filename + JsonLinesBackend.EXTENSION
+		self._file = None
+
+	def filenames(self):
+		return [self.filename]
+
+	def open(self):
+		self._file = open(self.filename, 'w')
+
+	def write_build_rows(self, build_row, case_rows):
+		lines = [self._line('build', ResultsBackend.BUILD_COLUMNS, build_row)]
+		lines += [self._line('case', ResultsBackend.CASE_COLUMNS, row) for row in case_rows]
+		self._file.writelines(lines)
+
+	def write_summary_rows(self, summary_rows):
+		self._file.writelines(self._line('summary', ResultsBackend.SUMMARY_COLUMNS, row) for row in summary_rows)
+
+	def save(self):
+		self._file.close()
+
+	def _line(self, record, columns, row):
+		values = dict(zip(ResultsBackend.column_names(columns), row))
+		values['record'] = record
+		return json.dumps(values, separators=(',', ':')) + '\n'
+
+class CsvBackend(ResultsBackend):
+	# One CSV file per table, each with a header row.
+	EXTENSION = '.csv'
+	TABLE_SUFFIXES = ['_builds', '_cases', '_summary']
+
+	def __init__(self, base_filename):
+		ResultsBackend.__init__(self)
+		self.base_filename = base_filename
+		self._files = []
+
+	def filenames(self):
+		return [self.base_filename + table + CsvBackend.EXTENSION for table in CsvBackend.TABLE_SUFFIXES]
+
+	def open(self):
+		self._builds = self._writer(self.filenames()[0], ResultsBackend.BUILD_COLUMNS)
+		self._cases = self._writer(self.filenames()[1], ResultsBackend.CASE_COLUMNS)
+		self._summary = self._writer(self.filenames()[2], ResultsBackend.SUMMARY_COLUMNS)
+
+	def write_build_rows(self, build_row, case_rows):
+		self._builds.writerow(build_row)
+		self._cases.writerows(case_rows)
+
+	def write_summary_rows(self, summary_rows):
+		self._summary.writerows(summary_rows)
+
+	def save(self):
+		for file in self._files:
+			file.close()
+
+	def _writer(self, filename, columns):
+		file = open(filename, 'w', newline='')
+		self._files.append(file)
+		writer = csv.writer(file)
+		writer.writerow(ResultsBackend.column_names(columns))
+		return writer
+
+class ColumnarBackend(ResultsBackend):
+	# Compact column-oriented file for per-case, per-build history. Every column is stored as one zlib-compressed
+	# typed array; strings are dictionary-encoded, so a job name or app title repeated on every row is stored once.
+	#
+	# Layout: MAGIC, a 4-byte big-endian header length, the zlib-compressed JSON header (tables -> columns -> kind,
+	# dictionary and compressed size, plus the byte order of the arrays), then the column blobs in header order.
+	# ColumnarBackend.load reads it back without openpyxl.
+	EXTENSION = '.rrc'
+	MAGIC = b'RRCOLS1\n'
+	TYPECODES = { 'int': 'q', 'bool': 'b', 'str': 'i' }
+
+	def __init__(self, base_filename):
+		ResultsBackend.__init__(self)
+		self.filename = base_filename + ColumnarBackend.EXTENSION
+		self.tables = { 'builds': ColumnTable(ResultsBackend.BUILD_COLUMNS), 'cases': ColumnTable(ResultsBackend.CASE_COLUMNS),
+			'summary': ColumnTable(ResultsBackend.SUMMARY_COLUMNS) }
+
+	def filenames(self):
+		return [self.filename]
+
+	def write_build_rows(self, build_row, case_rows):
+		self.tables['builds'].append_rows([build_row])
+		self.tables['cases'].append_rows(case_rows)
+
+	def write_summary_rows(self, summary_rows):
+		self.tables['summary'].append_rows(summary_rows)
+
+	def save(self):
+		header = { 'byteorder': sys.byteorder, 'tables': {} }
+		blobs = []
+		for table_name, table in self.tables.items():
+			header['tables'][table_name] = { 'rows': table.row_count, 'columns': [] }
+			for name, kind in table.columns:
+				blob = zlib.compress(table.values[name].tobytes())
+				header['tables'][table_name]['columns'].append({ 'name': name, 'kind': kind, 'size': len(blob),
+					'dictionary': table.dictionary_values(name) })
+				blobs.append(blob)
+		header_bytes = zlib.compress(json.dumps(header, separators=(',', ':')).encode('utf-8'))
+		with open(self.filename, 'wb') as file:
+			file.write(ColumnarBackend.MAGIC + struct.pack('>I', len(header_bytes)) + header_bytes)
+			for blob in blobs:
+				file.write(blob)
+
+	@staticmethod
+	def load(filename):
+		# Returns { table: { column: [values] } }.
+		tables = {}
+		with open(filename, 'rb') as file:
+			if file.read(len(ColumnarBackend.MAGIC)) != ColumnarBackend.MAGIC:
+				raise Exception('\'' + filename + '\' is not a columnar results file')
+			header = json.loads(zlib.decompress(file.read(struct.unpack('>I', file.read(4))[0])).decode('utf-8'))
+			for table_name, table in header['tables'].items():
+				tables[table_name] = {}
+				for column in table['columns']:
+					values = array(ColumnarBackend.TYPECODES[column['kind']])
+					values.frombytes(zlib.decompress(file.read(column['size'])))
+					if header['byteorder'] != sys.byteorder:
+						values.byteswap()
+					if column['kind'] == 'str':
+						dictionary = column['dictionary']
+						tables[table_name][column['name']] = [dictionary[index] if index >= 0 else None for index in values]
+					elif column['kind'] == 'bool':
+						tables[table_name][column['name']] = [bool(value) for value in values]
+					else:
+						tables[table_name][column['name']] = values.tolist()
+		return tables
+
+class ColumnTable:
+	def __init__(self, columns):
+		self.columns = columns
+		self.row_count = 0
+		self.values = { name: array(ColumnarBackend.TYPECODES[kind]) for name, kind in columns }
+		# value -> index for each string column; None is stored as -1.
+		self.dictionaries = { name: {} for name, kind in columns if kind == 'str' }
+
+	def append_rows(self, rows):
+		for index, (name, kind) in enumerate(self.columns):
+			if kind == 'str':
+				dictionary = self.dictionaries[name]
+				self.values[name].extend(-1 if row[index] is None else dictionary.setdefault(row[index], len(dictionary)) for row in rows)
+			else:
+				self.values[name].extend(int(row[index] or 0) for row in rows)
+		self.row_count += len(rows)
+
+	def dictionary_values(self, name):
+		return list(self.dictionaries[name]) if name in self.dictionaries else None
@@ -1,71 +1,314 @@
-from openpyxl import Workbook
+import os.path
+import sys
+from concurrent.futures import ThreadPoolExecutor
 
-from build_results import BuildResultsService
+from build_results import BuildResultsService, JenkinsClient
 from config import JobReportingConfigManager
-from excel_reporting import WorkbookManager
-from reporting_ui import ProgressBar, ReportingStatus
+from http_pool import HttpConnectionPool
+from output_backends import ColumnarBackend, CsvBackend, ExcelBackend, JsonLinesBackend
+from reporting_ui import ProgressBar, ProgressBus, ProgressLog
 from utils import Logger, CommandArgumentsParser
 
-config_filename = CommandArgumentsParser.get_argument('config-filename', 'c')
-if config_filename and config_filename is True:
-	print('INFO: Did not specify any config filename value, so the default will be used.')
-	config_filename = None
-
-config_manager = JobReportingConfigManager(config_filename)
-config_manager.read_config_from_file()
-excel_manager = WorkbookManager(Workbook(), config_manager.percentage_formatting)
-logger = Logger(header='Regression Results Report')
-
-def compose_overall_result(config, test_results):
-	return {
-		'app_title': config.sheet_title,
-		'number_passing': sum(result['number_passing'] for result in test_results),
-		'number_failing': sum(result['number_failing'] for result in test_results),
-		'failure_links': None
-	}
-
-is_rerun = False
-overall_results = []
-for config in config_manager.rerun_job_configs:
-	build_service = BuildResultsService(config, logger)
-	try:
-		results = build_service.compose_rerun_regression_results()
-		overall_result = compose_overall_result(config, results)
-		overall_results.append(overall_result)
-
-		sorted_results = sorted(results, key=lambda k: k['app_title'])
-		excel_manager.write_results_to_worksheet(sorted_results, config.sheet_title, is_rerun)
-		is_rerun = True
-	except:
-		build_service.stop_execution()
-		raise
-for config in config_manager.job_group_configs:
-	build_service = BuildResultsService(config, logger)
-	group_results = []
-
-	reporting_status = ReportingStatus(0, len(config.job_application_mappings))
-	progress_bar = ProgressBar(reporting_status, config.view_name)
-	progress_bar.start()
-	try:
-		for app_title in config.job_application_mappings:
-			job_config = config.config_for(app_title)
-			build_service = BuildResultsService(job_config, logger)
-			results = build_service.compose_single_job_regression_results(app_title)
-			group_results.append(results)
-			reporting_status.current_build_number += 1
-		reporting_status.current_build_number += 1
-		progress_bar.join()
-		overall_result = compose_overall_result(config, group_results)
-		overall_results.append(overall_result)
-
-		sorted_results = sorted(group_results, key=lambda k: k['app_title'])
-		excel_manager.write_results_to_worksheet(group_results, config.sheet_title, is_rerun)
-	except:
-		progress_bar.stop_execution()
-		raise
-	is_rerun = True
-
-excel_manager.write_results_to_worksheet(overall_results, 'Regression Results', True, table_name='Module',
-	table_title='Overall Automated Regression Results', is_failures_reported=False, is_main_sheet=True)
-excel_manager.save_workbook()
-logger.dump()
\ No newline at end of file
+# Only what every run needs is imported up front. Optional features (profiling, the response cache, the incremental
+# snapshot, streamed JSON parsing, the results store) are imported when they are switched on, and openpyxl when the
+# first sheet is written.
+DEFAULT_PARALLEL_JOBS = 8
+DEFAULT_OUTPUT_FORMATS = 'xlsx'
+DEFAULT_PROFILE_FILENAME = 'regression_results.prof'
+OUTPUT_BACKENDS = { 'jsonl': JsonLinesBackend, 'csv': CsvBackend, 'columnar': ColumnarBackend }
+
+class RegressionReport:
+	def __init__(self, config_manager, logger, snapshot, progress_bus, output_backends):
+		self.config_manager = config_manager
+		self.logger = logger
+		self.snapshot = snapshot
+		self.progress_bus = progress_bus
+		self.output_backends = output_backends
+
+	def compose_overall_result(self, config, test_results):
+		return {
+			'app_title': config.sheet_title,
+			'number_passing': sum(result['number_passing'] for result in test_results),
+			'number_failing': sum(result['number_failing'] for result in test_results),
+			'failure_links': None
+		}
+
+	def compose_rerun_results(self, config):
+		build_service = BuildResultsService(config, self.logger, self.snapshot, self.progress_bus, self.output_backends)
+		try:
+			return sorted(build_service.compose_rerun_regression_results(), key=lambda k: k['app_title'])
+		except:
+			build_service.stop_execution()
+			raise
+
+	def compose_group_app_results(self, config, app_title):
+		build_service = BuildResultsService(config.config_for(app_title), self.logger, self.snapshot,
+			output_backends=self.output_backends)
+		return build_service.compose_single_job_regression_results(app_title)
+
+	def compose_serial_sheet_results(self):
+		sheet_results = []
+		for config in self.config_manager.rerun_job_configs:
+			sheet_results.append((config, self.compose_rerun_results(config)))
+		for config in self.config_manager.job_group_configs:
+			group_results = []
+			reporting_status = self.progress_bus.task(config.view_name, len(config.job_application_mappings))
+			try:
+				for app_title in config.job_application_mappings:
+					group_results.append(self.compose_group_app_results(config, app_title))
+					reporting_status.advance()
+				reporting_status.finish()
+			except:
+				reporting_status.stop()
+				raise
+			sheet_results.append((config, group_results))
+		return sheet_results
+
+	def compose_pipelined_sheet_results(self, max_workers):
+		# Every rerun job and every app of every group runs as its own task; the connection pool bounds how many requests
+		# they have in flight together. Results are collected back in config order, so sheets come out the same as a
+		# serial run. Rerun jobs report their own progress next to the overall count of finished tasks.
+		group_apps = [(config, list(config.job_application_mappings)) for config in self.config_manager.job_group_configs]
+		reporting_status = self.progress_bus.task('Regression Results',
+			len(self.config_manager.rerun_job_configs) + sum(len(apps) for config, apps in group_apps))
+
+		def run_task(task, *args):
+			results = task(*args)
+			reporting_status.advance()
+			return results
+
+		executor = ThreadPoolExecutor(max_workers=max_workers)
+		try:
+			rerun_futures = [(config, executor.submit(run_task, self.compose_rerun_results, config))
+				for config in self.config_manager.rerun_job_configs]
+			group_futures = [(config, [executor.submit(run_task, self.compose_group_app_results, config, app_title)
+				for app_title in apps]) for config, apps in group_apps]
+			sheet_results = [(config, future.result()) for config, future in rerun_futures]
+			sheet_results += [(config, [future.result() for future in futures]) for config, futures in group_futures]
+			reporting_status.finish()
+		except:
+			# Once a task has failed the report will not be written, so tasks still queued are dropped; only the ones
+			# already running are waited for.
+			executor.shutdown(cancel_futures=True)
+			reporting_status.stop()
+			raise
+		executor.shutdown()
+		return sheet_results
+
+	def write_results(self, sheet_results):
+		is_rerun = False
+		overall_results = []
+		for config, results in sheet_results:
+			overall_results.append(self.compose_overall_result(config, results))
+			for backend in self.output_backends:
+				backend.write_results(results, config.sheet_title, is_rerun)
+			is_rerun = True
+
+		# Flakiness is only known for group jobs, which keep a status per test case.
+		if self.config_manager.job_group_configs:
+			flaky_tests = [(result['app_title'], stats) for config, results in sheet_results for result in results
+				for stats in result.get('flaky_tests', [])]
+			self.logger.log_info('Found ' + str(len(flaky_tests)) + ' flaky test(s)')
+			for backend in self.output_backends:
+				backend.write_flaky_tests(flaky_tests)
+
+		for backend in self.output_backends:
+			backend.write_results(overall_results, 'Regression Results', True, table_name='Module',
+				table_title='Overall Automated Regression Results', is_failures_reported=False, is_main_sheet=True)
+			backend.save()
+
+	def run(self, parallel_jobs=None):
+		for backend in self.output_backends:
+			backend.open()
+		if parallel_jobs:
+			sheet_results = self.compose_pipelined_sheet_results(parallel_jobs)
+		else:
+			sheet_results = self.compose_serial_sheet_results()
+		self.progress_bus.close()
+		self.write_results(sheet_results)
+		if self.snapshot:
+			self.snapshot.save()
+
+def start_profiler():
+	profile_filename = CommandArgumentsParser.get_argument('profile', 'p')
+	if not profile_filename:
+		return None, None
+	import cProfile
+	profiler = cProfile.Profile()
+	profiler.enable()
+	return profiler, profile_filename if profile_filename is not True else DEFAULT_PROFILE_FILENAME
+
+def configure_jenkins_client(is_refreshing):
+	request_timeout = CommandArgumentsParser.get_argument('timeout', 't')
+	max_connections_per_host = CommandArgumentsParser.get_argument('max-connections', 'm')
+	max_requests_in_flight = CommandArgumentsParser.get_argument('max-requests', 'q')
+	JenkinsClient.connection_pool = HttpConnectionPool(
+		max_connections_per_host if max_connections_per_host is not True else None,
+		request_timeout if request_timeout is not True else None,
+		max_requests_in_flight=max_requests_in_flight if max_requests_in_flight is not True else None)
+
+	JenkinsClient.is_streaming = bool(CommandArgumentsParser.get_argument('stream-json', 'j'))
+
+	is_cache_disabled = CommandArgumentsParser.get_argument('no-cache', 'n')
+	if not is_cache_disabled:
+		from build_cache import BuildResultsCache
+		cache_filename = CommandArgumentsParser.get_argument('cache-filename', 'f')
+		if cache_filename is True:
+			print('INFO: Did not specify any cache filename value, so the default will be used.')
+			cache_filename = None
+		cache_max_age_days = CommandArgumentsParser.get_argument('cache-max-age', 'a')
+		cache_max_size_mb = CommandArgumentsParser.get_argument('cache-max-size', 's')
+		JenkinsClient.cache = BuildResultsCache(cache_filename,
+			cache_max_age_days if cache_max_age_days is not True else None,
+			cache_max_size_mb if cache_max_size_mb is not True else None,
+			is_refreshing)
+
+def load_snapshot(is_refreshing, snapshot_suffix=None):
+	snapshot_filename = CommandArgumentsParser.get_argument('incremental', 'i')
+	if not snapshot_filename:
+		return None
+	from report_snapshot import ReportSnapshot
+	snapshot_filename = snapshot_filename if snapshot_filename is not True else ReportSnapshot.DEFAULT_FILENAME
+	if snapshot_suffix:
+		# Configs can report the same job with different parsers, so each keeps its own snapshot.
+		snapshot_filename = os.path.splitext(snapshot_filename)[0] + '_' + snapshot_suffix + os.path.splitext(snapshot_filename)[1]
+	snapshot = ReportSnapshot(snapshot_filename, is_refreshing)
+	snapshot.load()
+	return snapshot
+
+def config_name(config_filename):
+	return os.path.splitext(os.path.basename(config_filename or JobReportingConfigManager.DEFAULT_CONFIG_FILENAME))[0]
+
+def config_output_filename(output_filename, config_filename):
+	# With several configs each report is named after its config, behind --output if one was given, e.g.
+	# nightly_reporting_config_arkonap.xlsx.
+	output_base_filename = (output_filename or '').replace(ExcelBackend.EXTENSION, '')
+	return (output_base_filename + '_' if output_base_filename else '') + config_name(config_filename)
+
+def create_output_backends(config_manager, output_filename, output_formats, is_batch, is_overwriting, is_write_only):
+	output_base_filename = (output_filename or ExcelBackend.DEFAULT_FILENAME).replace(ExcelBackend.EXTENSION, '')
+	output_backends = [OUTPUT_BACKENDS[output_format](output_base_filename) for output_format in output_formats if output_format != 'xlsx']
+	# Exports are streamed without asking, so they are checked before anything is fetched; the workbook is too in batch
+	# mode so that a scheduled run fails straight away rather than after the whole report.
+	existing_filenames = [filename for backend in output_backends for filename in backend.filenames() if os.path.isfile(filename)]
+	if 'xlsx' in output_formats:
+		excel_backend = ExcelBackend(config_manager.percentage_formatting, output_filename, is_overwriting, not is_batch,
+			is_write_only, JenkinsClient.metrics)
+		if is_batch:
+			existing_filenames += [filename for filename in excel_backend.filenames() if os.path.isfile(filename)]
+		output_backends.insert(0, excel_backend)
+	if existing_filenames and not is_overwriting:
+		print('ERROR: ' + ', '.join('\'' + filename + '\'' for filename in existing_filenames) + ' already exist(s); pass --overwrite to replace')
+		sys.exit(1)
+	results_store_filename = CommandArgumentsParser.get_argument('store', 'l')
+	if results_store_filename:
+		from results_store import ResultsStore
+		output_backends.append(ResultsStore(results_store_filename if results_store_filename is not True else None))
+	return output_backends
+
+def main():
+	profiler, profile_filename = start_profiler()
+
+	metrics_filename = CommandArgumentsParser.get_argument('metrics-filename', 'x')
+	if metrics_filename is True:
+		print('INFO: Did not specify any metrics filename value, so the default will be used.')
+		metrics_filename = None
+
+	# --config-filename can be repeated (or given a comma-separated list) to report several configs in one run.
+	config_filenames = []
+	for config_filename in CommandArgumentsParser.get_arguments('config-filename', 'c'):
+		if config_filename is True:
+			print('INFO: Did not specify any config filename value, so the default will be used.')
+			config_filenames.append(None)
+		else:
+			config_filenames += config_filename.split(',')
+	config_filenames = config_filenames or [None]
+	is_multi_config = len(config_filenames) > 1
+
+	max_fetch_workers = CommandArgumentsParser.get_argument('workers', 'w')
+	if max_fetch_workers is True:
+		print('INFO: Did not specify any number of workers, so builds will be fetched one at a time.')
+		max_fetch_workers = None
+	elif max_fetch_workers:
+		max_fetch_workers = int(max_fetch_workers)
+
+	parallel_jobs = CommandArgumentsParser.get_argument('parallel-jobs', 'g')
+	if parallel_jobs is True:
+		print('INFO: Did not specify any number of parallel jobs, so the default will be used.')
+		parallel_jobs = DEFAULT_PARALLEL_JOBS
+	elif parallel_jobs:
+		parallel_jobs = int(parallel_jobs)
+
+	is_refreshing = bool(CommandArgumentsParser.get_argument('refresh', 'r'))
+	configure_jenkins_client(is_refreshing)
+	if is_multi_config:
+		# Configs often cover the same jobs, so every response is kept in memory for the rest of the run; the
+		# connection pool is already shared.
+		from build_cache import MemoryResultsCache
+		JenkinsClient.cache = MemoryResultsCache(JenkinsClient.cache)
+
+	is_write_only = bool(CommandArgumentsParser.get_argument('write-only', 'e'))
+
+	# Batch mode never prompts, so it can run under cron or CI: the workbook goes to --output (or the default filename),
+	# an existing file is only replaced with --overwrite, and progress is logged periodically instead of drawn.
+	is_batch = bool(CommandArgumentsParser.get_argument('batch', 'b'))
+	output_filename = CommandArgumentsParser.get_argument('output', 'o')
+	if output_filename is True:
+		print('INFO: Did not specify any output filename value, so the default will be used.')
+		output_filename = None
+	is_overwriting = bool(CommandArgumentsParser.get_argument('overwrite', 'y'))
+
+	# Besides the workbook (xlsx), raw per-build and per-case results can be exported as jsonl, csv or columnar files
+	# named after --output, e.g. --formats=xlsx,columnar.
+	output_formats = CommandArgumentsParser.get_argument('formats', 'k')
+	if output_formats is True:
+		print('INFO: Did not specify any output formats, so only the workbook will be written.')
+		output_formats = None
+	output_formats = (output_formats or DEFAULT_OUTPUT_FORMATS).split(',')
+	unknown_formats = [output_format for output_format in output_formats if output_format != 'xlsx' and output_format not in OUTPUT_BACKENDS]
+	if unknown_formats:
+		print('ERROR: Unknown output format(s) ' + ', '.join(unknown_formats) + '; expected xlsx, ' + ', '.join(OUTPUT_BACKENDS))
+		sys.exit(1)
+	# With --incremental only the builds past the snapshot are fetched, so an export would hold just those instead of the
+	# reporting window. The results store is not affected, since it keeps every build it has been given.
+	export_formats = [output_format for output_format in output_formats if output_format != 'xlsx']
+	if export_formats and CommandArgumentsParser.get_argument('incremental', 'i'):
+		print('ERROR: Output format(s) ' + ', '.join(export_formats) + ' cannot be combined with --incremental; use xlsx, or --store '
+			'to keep every build')
+		sys.exit(1)
+
+	# Every config is read and its outputs checked before anything is fetched.
+	logger = Logger(header='Regression Results Report')
+	reports = []
+	for config_filename in config_filenames:
+		config_manager = JobReportingConfigManager(config_filename, max_fetch_workers)
+		config_manager.read_config_from_file()
+		output_backends = create_output_backends(config_manager,
+			config_output_filename(output_filename, config_filename) if is_multi_config else output_filename, output_formats,
+			is_batch, is_overwriting, is_write_only)
+		snapshot = load_snapshot(is_refreshing, config_name(config_filename) if is_multi_config else None)
+		progress_bus = ProgressBus(ProgressLog() if is_batch else ProgressBar())
+		reports.append(RegressionReport(config_manager, logger, snapshot, progress_bus, output_backends))
+
+	for report in reports:
+		if is_multi_config:
+			logger.log_info('Reporting \'' + report.config_manager.config_filename + '\'')
+		report.run(parallel_jobs)
+
+	if is_multi_config:
+		logger.log_info('Served ' + str(JenkinsClient.cache.memory_hits) + ' response(s) from memory shared between configs')
+	if JenkinsClient.cache:
+		JenkinsClient.cache.close()
+	JenkinsClient.connection_pool.close()
+	logger.log_info('Opened ' + str(JenkinsClient.connection_pool.connections_opened) + ' connection(s) to Jenkins, reused ' +
+		str(JenkinsClient.connection_pool.connections_reused) + ', retried ' + str(JenkinsClient.connection_pool.retries) +
+		' request(s)')
+	if profiler:
+		profiler.disable()
+		profiler.dump_stats(profile_filename)
+		logger.log_info('Wrote profile to \'' + profile_filename + '\'')
+	JenkinsClient.metrics.save(metrics_filename, JenkinsClient.cache, JenkinsClient.connection_pool)
+	logger.dump()
+
+if __name__ == '__main__':
+	main()
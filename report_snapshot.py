@@ -0,0 +1,48 @@
+import json
+import os.path
+import threading
+
+class ReportSnapshot:
+	DEFAULT_FILENAME = 'report_snapshot.json'
+	# Bumped whenever the stored results change shape; snapshots from another version are ignored and rebuilt.
+	VERSION = 3
+
+	def __init__(self, filename=None, is_refreshing=False):
+		self.filename = filename or ReportSnapshot.DEFAULT_FILENAME
+		self.is_refreshing = is_refreshing
+		self.job_states = {}
+		self._lock = threading.Lock()
+
+	def load(self):
+		if os.path.isfile(self.filename) and not self.is_refreshing:
+			with open(self.filename) as file:
+				snapshot = json.load(file)
+			if snapshot.get('version') == ReportSnapshot.VERSION:
+				self.job_states = snapshot['job_states']
+
+	def save(self):
+		with self._lock:
+			with open(self.filename, 'w') as file:
+				json.dump({ 'version': ReportSnapshot.VERSION, 'job_states': self.job_states }, file,
+					default=lambda record: record.to_dict())
+
+	def job_state(self, base_url, view_name, job_name, job_state, record_class):
+		# Fills in a fresh job_state, whose watermark sits just below the reporting window, with what is stored for the
+		# job. Only results from builds still inside the window are carried over; anything older would have been outside
+		# the range that a full run fetches.
+		with self._lock:
+			state = self.job_states.get(self._job_key(base_url, view_name, job_name))
+		if state:
+			results = [record_class.from_dict(result) for result in state['results']]
+			job_state['results'] = [result for result in results if result.build_number > job_state['watermark']]
+			job_state['watermark'] = max(state['watermark'], job_state['watermark'])
+			# Anything else kept for the job (e.g. running flakiness totals) carries over as it is.
+			job_state.update((key, value) for key, value in state.items() if key not in job_state)
+		return job_state
+
+	def update_job_state(self, base_url, view_name, job_name, job_state):
+		with self._lock:
+			self.job_states[self._job_key(base_url, view_name, job_name)] = job_state
+
+	def _job_key(self, base_url, view_name, job_name):
+		return base_url + '/view/' + view_name + '/job/' + job_name
@@ -2,63 +2,162 @@ import threading
 import sys
 import time
 
-class ProgressBar(threading.Thread):
-	DEFAULT_FPS = 20
+class ReportingStatus:
+	# Progress of one job. Stages push steps to it as they finish, and the bus it belongs to (if any) re-renders; a
+	# status without a bus just counts. Completion is an event that other threads can wait on.
+	def __init__(self, name, total_steps, bus=None):
+		self.name = name
+		self.total_steps = max(total_steps, 1)
+		self.completed_steps = 0
+		self.is_stopped = False
+		self.bus = bus
+		self._completed = threading.Event()
+		self._lock = threading.Lock()
+
+	def advance(self, steps=1):
+		with self._lock:
+			self.completed_steps = min(self.completed_steps + steps, self.total_steps)
+		self._changed()
+
+	def finish(self):
+		with self._lock:
+			self.completed_steps = self.total_steps
+		self._completed.set()
+		self._changed()
+
+	def stop(self):
+		self.is_stopped = True
+		self._completed.set()
+		self._changed()
+
+	def is_complete(self):
+		return self._completed.is_set()
+
+	def wait(self, timeout=None):
+		return self._completed.wait(timeout)
+
+	def percent_complete(self):
+		with self._lock:
+			return float(self.completed_steps) / self.total_steps
+
+	def _changed(self):
+		if self.bus:
+			self.bus.changed(self)
+
+class ProgressBus:
+	# One display for every job of a run. Updates mark the display dirty and it is rendered at most once per
+	# renderer interval; an update that arrives too early is picked up by a single trailing render, and a job
+	# finishing always renders at once.
+	def __init__(self, renderer, min_interval_seconds=None):
+		self.renderer = renderer
+		self.min_interval_seconds = renderer.MIN_INTERVAL_SECONDS if min_interval_seconds is None else min_interval_seconds
+		self._statuses = []
+		self._last_render = 0.0
+		self._timer = None
+		self._is_closed = False
+		self._lock = threading.Lock()
+		self._render_lock = threading.Lock()
+
+	def task(self, name, total_steps):
+		status = ReportingStatus(name, total_steps, self)
+		with self._lock:
+			self._statuses.append(status)
+		self.changed(status)
+		return status
+
+	def changed(self, status):
+		with self._lock:
+			if self._is_closed:
+				return
+			wait_seconds = self._last_render + self.min_interval_seconds - time.perf_counter()
+			if wait_seconds > 0 and not status.is_complete():
+				if not self._timer:
+					self._timer = threading.Timer(wait_seconds, self._render)
+					self._timer.daemon = True
+					self._timer.start()
+				return
+		self._render()
+
+	def close(self):
+		with self._lock:
+			self._is_closed = True
+			if self._timer:
+				self._timer.cancel()
+		self._render()
+		self.renderer.close()
+
+	def _render(self):
+		with self._render_lock:
+			with self._lock:
+				self._timer = None
+				self._last_render = time.perf_counter()
+				finished = [status for status in self._statuses if status.is_complete()]
+				self._statuses = [status for status in self._statuses if not status.is_complete()]
+				active = list(self._statuses)
+			self.renderer.render(active, finished)
+
+class ProgressBar:
+	# Draws one bar per running job, redrawn in place; a job's final bar is left above the running ones when it
+	# finishes.
+	MIN_INTERVAL_SECONDS = 0.1
 	PROGRESS_ICON = '#'
 	NO_PROGRESS_ICON = '-'
 
-	def __init__(self, reporting_status, job_name, bar_width=20, fps=DEFAULT_FPS):
-		threading.Thread.__init__(self)
-		self.reporting_status = reporting_status
+	def __init__(self, bar_width=20, stream=None):
 		self.bar_width = bar_width
-		self.fps = fps
-		self.job_name = job_name
-		self.manual_progression = 0.0
-		self._is_running = True
-
-	def progress(self, percentage):
-		self.manual_progression += percentage
-
-	def run(self):
-		percent_complete = self._percent_complete()
-		while percent_complete < 1.0 and self._is_running:
-			# print('really: ' + str(self.reporting_status.current_build_number))
-			bar_value = self.job_name + '> ['
-			# sys.stdout.write("\r{0}>".format())
-			number_bars = int(percent_complete * self.bar_width)
-			for i in range(0, number_bars):
-				# sys.stdout.write("\r{0}>".format(ProgressBar.PROGRESS_ICON))
-				bar_value += ProgressBar.PROGRESS_ICON
-			for i in range(0, (self.bar_width - number_bars)):
-				# sys.stdout.write("\r{0}>".format(ProgressBar.NO_PROGRESS_ICON))
-				bar_value += ProgressBar.NO_PROGRESS_ICON
-			percent_value = percent_complete * 100
-			# sys.stdout.write("\r{0}>".format(']' + str(round(percent_value, 2)) + '%'))
-			bar_value += '] ' + str(round(percent_value, 2)) + '%'
-			sys.stdout.write("\r{0}".format(bar_value))
-			sys.stdout.flush()
-
-			percent_complete = self._percent_complete()
-			time.sleep(1.0 / self.fps)
-			# print('percentage is ' + str(percent_value))
-		bar_value = self.job_name + '> [' + (ProgressBar.PROGRESS_ICON * self.bar_width) + '] 100.00%'
-		sys.stdout.write("\r{0}".format(bar_value))
-		sys.stdout.flush()
-		print('')
-
-	def stop_execution(self):
-		self._is_running = False
-
-	def _percent_complete(self):
-		# reporting_status = self.results_service.reporting_status()
-		starting_build_number = self.reporting_status.starting_build_number
-		actual_percent_complete = (float(self.reporting_status.current_build_number - starting_build_number) /
-			float(self.reporting_status.ending_build_number - starting_build_number))
-		percent_complete = (1 - self.manual_progression) * actual_percent_complete
-		return percent_complete
+		self.stream = stream or sys.stdout
+		self._drawn_lines = 0
 
-class ReportingStatus:
-	def __init__(self, starting_build_number, ending_build_number):
-		self.starting_build_number = starting_build_number
-		self.ending_build_number = ending_build_number
-		self.current_build_number = starting_build_number
\ No newline at end of file
+	def render(self, active, finished):
+		output = ''
+		if self._drawn_lines > 1:
+			output += '\x1b[' + str(self._drawn_lines - 1) + 'F'
+		if self._drawn_lines:
+			output += '\r\x1b[J'
+		output += ''.join(self._bar(status) + '\n' for status in finished)
+		output += '\n'.join(self._bar(status) for status in active)
+		self._drawn_lines = len(active)
+		self.stream.write(output)
+		self.stream.flush()
+
+	def close(self):
+		if self._drawn_lines:
+			self.stream.write('\n')
+			self.stream.flush()
+			self._drawn_lines = 0
+
+	def _bar(self, status):
+		percent_complete = status.percent_complete()
+		number_bars = int(percent_complete * self.bar_width)
+		bar_value = (status.name + '> [' + ProgressBar.PROGRESS_ICON * number_bars +
+			ProgressBar.NO_PROGRESS_ICON * (self.bar_width - number_bars) + '] ' + '%.2f' % (percent_complete * 100) + '%')
+		return bar_value + ' (stopped)' if status.is_stopped else bar_value
+
+class ProgressLog:
+	# Used in batch runs: writes a timestamped line per job whose progress moved, at most once per interval, and one
+	# when each job finishes.
+	MIN_INTERVAL_SECONDS = 10.0
+
+	def __init__(self, stream=None):
+		self.stream = stream or sys.stdout
+		self._logged_percents = {}
+
+	def render(self, active, finished):
+		lines = []
+		for status in finished:
+			self._logged_percents.pop(status, None)
+			lines.append(self._line(status, 'stopped' if status.is_stopped else 'done'))
+		for status in active:
+			percent_value = round(status.percent_complete() * 100, 2)
+			if self._logged_percents.get(status) != percent_value:
+				self._logged_percents[status] = percent_value
+				lines.append(self._line(status, str(percent_value) + '%'))
+		if lines:
+			self.stream.write(''.join(lines))
+			self.stream.flush()
+
+	def close(self):
+		pass
+
+	def _line(self, status, progress):
+		return '[' + time.strftime('%Y-%m-%d %H:%M:%S') + '] ' + status.name + ': ' + progress + '\n'
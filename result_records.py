@@ -0,0 +1,85 @@
+class Link:
+	__slots__ = ['value', 'url']
+
+	def __init__(self, value, url):
+		self.value = value
+		self.url = url
+
+class FailureLink:
+	# A failing test case as it appears on the worksheet. Only the parts are kept: the URL prefix is shared by every
+	# failure of a build and the class path by every case of a test file, so the link text and URL are only built
+	# for failures that actually get written.
+	__slots__ = ['name', 'file_name', 'url_prefix', 'class_path']
+
+	def __init__(self, name, file_name, url_prefix, class_path):
+		self.name = name
+		self.file_name = file_name
+		self.url_prefix = url_prefix
+		self.class_path = class_path
+
+	@property
+	def value(self):
+		return self.file_name + '.' + self.name if self.file_name else self.name
+
+	@property
+	def url(self):
+		return self.url_prefix + self.class_path + self.name
+
+	def to_dict(self):
+		return { 'name': self.name, 'file_name': self.file_name, 'url_prefix': self.url_prefix, 'class_path': self.class_path }
+
+	@staticmethod
+	def from_dict(data):
+		return FailureLink(data['name'], data['file_name'], data['url_prefix'], data['class_path']) if data else None
+
+class BuildResult:
+	__slots__ = ['build_number', 'timestamp', 'number_passing', 'number_failing', 'application', 'app_title', 'failure_links',
+		'test_cases']
+
+	def __init__(self, build_number):
+		self.build_number = build_number
+		# When the build started, in epoch milliseconds as Jenkins reports it.
+		self.timestamp = None
+		self.number_passing = 0
+		self.number_failing = 0
+		self.application = None
+		self.app_title = None
+		self.failure_links = []
+		self.test_cases = []
+
+	def to_dict(self):
+		return { 'build_number': self.build_number, 'timestamp': self.timestamp, 'number_passing': self.number_passing, 'number_failing': self.number_failing,
+			'app_title': self.app_title, 'failure_links': [link.to_dict() for link in self.failure_links] }
+
+	@staticmethod
+	def from_dict(data):
+		if isinstance(data, BuildResult):
+			return data
+		result = BuildResult(data['build_number'])
+		result.timestamp = data.get('timestamp')
+		result.number_passing = data['number_passing']
+		result.number_failing = data['number_failing']
+		result.app_title = data['app_title']
+		result.failure_links = [FailureLink.from_dict(link) for link in data['failure_links']]
+		return result
+
+class TestCaseResult:
+	# case_name starts out as the full test name and is replaced by the deduplication key once the case is folded
+	# into the latest results of its job.
+	__slots__ = ['case_name', 'is_passing', 'failure_link', 'build_number']
+
+	def __init__(self, case_name, is_passing, failure_link, build_number):
+		self.case_name = case_name
+		self.is_passing = is_passing
+		self.failure_link = failure_link
+		self.build_number = build_number
+
+	def to_dict(self):
+		return { 'case_name': self.case_name, 'is_passing': self.is_passing, 'build_number': self.build_number,
+			'failure_link': self.failure_link.to_dict() if self.failure_link else None }
+
+	@staticmethod
+	def from_dict(data):
+		if isinstance(data, TestCaseResult):
+			return data
+		return TestCaseResult(data['case_name'], data['is_passing'], FailureLink.from_dict(data['failure_link']), data['build_number'])
@@ -0,0 +1,86 @@
+import sqlite3
+import time
+
+from output_backends import ResultsBackend
+
+class ResultsStore(ResultsBackend):
+	# Local history of every build and test case a run has fetched. Unlike the reporting window, which is
+	# re-fetched each run, rows are kept across runs, so per-test and per-app history can be queried without
+	# touching Jenkins. Time-based queries go by when a build ran (its Jenkins timestamp, in epoch milliseconds), not
+	# by recorded_at, the time this tool first stored it, so a backfilled history still falls on the right days.
+	DEFAULT_FILENAME = 'results_store.sqlite'
+	MILLISECONDS_PER_DAY = 24 * 60 * 60 * 1000
+	SCHEMA_VERSION = 2
+
+	def __init__(self, filename=None):
+		ResultsBackend.__init__(self)
+		self.filename = filename or ResultsStore.DEFAULT_FILENAME
+		self._connection = None
+
+	def open(self):
+		self._connection = sqlite3.connect(self.filename, check_same_thread=False)
+		self._connection.execute('PRAGMA journal_mode=WAL')
+		self._connection.execute('PRAGMA synchronous=NORMAL')
+		if self._connection.execute('PRAGMA user_version').fetchone()[0] != ResultsStore.SCHEMA_VERSION:
+			self._connection.execute('DROP TABLE IF EXISTS builds')
+			self._connection.execute('DROP TABLE IF EXISTS cases')
+			self._connection.execute('PRAGMA user_version = ' + str(ResultsStore.SCHEMA_VERSION))
+		self._connection.execute('CREATE TABLE IF NOT EXISTS builds (view TEXT NOT NULL, job TEXT NOT NULL, '
+			'build_number INTEGER NOT NULL, app_title TEXT, number_passing INTEGER NOT NULL, number_failing INTEGER NOT NULL, '
+			'timestamp INTEGER, recorded_at REAL NOT NULL, PRIMARY KEY (view, job, build_number))')
+		self._connection.execute('CREATE TABLE IF NOT EXISTS cases (view TEXT NOT NULL, job TEXT NOT NULL, '
+			'build_number INTEGER NOT NULL, app_title TEXT, case_name TEXT NOT NULL, is_passing INTEGER NOT NULL, failure_url TEXT)')
+		self._connection.execute('CREATE INDEX IF NOT EXISTS cases_by_name ON cases (job, case_name, build_number)')
+		self._connection.execute('CREATE INDEX IF NOT EXISTS cases_by_app ON cases (job, app_title, is_passing, build_number)')
+		# Covers app_pass_rates, which groups by app and filters on timestamp, without reading the table.
+		self._connection.execute('CREATE INDEX IF NOT EXISTS builds_by_app ON builds (job, app_title, timestamp, number_passing, '
+			'number_failing)')
+		self._connection.commit()
+
+	def filenames(self):
+		return []
+
+	def write_build_rows(self, build_row, case_rows):
+		# A build fetched again (e.g. after --refresh) replaces its earlier rows but keeps its original recorded_at.
+		view, job, build_number = build_row[:3]
+		is_new_build = self._connection.execute('INSERT OR IGNORE INTO builds VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+			build_row + (time.time(),)).rowcount > 0
+		if not is_new_build:
+			self._connection.execute('UPDATE builds SET app_title = ?, number_passing = ?, number_failing = ?, timestamp = ? WHERE view = ? AND '
+				'job = ? AND build_number = ?', build_row[3:] + (view, job, build_number))
+			self._connection.execute('DELETE FROM cases WHERE job = ? AND build_number = ? AND view = ?', (job, build_number, view))
+		self._connection.executemany('INSERT INTO cases VALUES (?, ?, ?, ?, ?, ?, ?)', case_rows)
+		self._connection.commit()
+
+	def save(self):
+		self.close()
+
+	def close(self):
+		with self._lock:
+			if self._connection:
+				self._connection.commit()
+				self._connection.close()
+				self._connection = None
+
+	def case_history(self, job, case_name, count=10):
+		# The last count results of one test case as (build_number, is_passing, failure_url), newest first.
+		with self._lock:
+			rows = self._connection.execute('SELECT build_number, is_passing, failure_url FROM cases WHERE job = ? AND case_name = ? '
+				'ORDER BY build_number DESC LIMIT ?', (job, case_name, count)).fetchall()
+		return [(build_number, bool(is_passing), failure_url) for build_number, is_passing, failure_url in rows]
+
+	def app_pass_rates(self, days=90, job=None):
+		# { (job, app_title): pass rate } over the builds that ran in the last days.
+		query = ('SELECT job, app_title, SUM(number_passing), SUM(number_failing) FROM builds WHERE timestamp >= ?' +
+			(' AND job = ?' if job else '') + ' GROUP BY job, app_title')
+		parameters = (int(time.time() * 1000) - days * ResultsStore.MILLISECONDS_PER_DAY,) + ((job,) if job else ())
+		with self._lock:
+			rows = self._connection.execute(query, parameters).fetchall()
+		return { (job_name, app_title): float(passing) / (passing + failing) if passing + failing else None
+			for job_name, app_title, passing, failing in rows }
+
+	def app_failures(self, job, app_title, count=100):
+		# The most recent failing cases of an app as (build_number, case_name, failure_url), newest first.
+		with self._lock:
+			return self._connection.execute('SELECT build_number, case_name, failure_url FROM cases WHERE job = ? AND app_title = ? '
+				'AND is_passing = 0 ORDER BY build_number DESC LIMIT ?', (job, app_title, count)).fetchall()
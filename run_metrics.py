@@ -0,0 +1,80 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+class RunMetrics:
+	DEFAULT_FILENAME = 'run_metrics.json'
+	SLOWEST_REQUEST_COUNT = 10
+	FLAKY_TEST_COUNT = 10
+
+	def __init__(self):
+		self.started_at = time.time()
+		self.requests = { 'count': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'bytes_received': 0, 'bytes_decoded': 0 }
+		self.slowest_requests = []
+		self.stages = {}
+		self.flaky_tests = {}
+		self._clock_start = time.perf_counter()
+		self._lock = threading.Lock()
+
+	def record_request(self, url, seconds, bytes_received, bytes_decoded=None):
+		with self._lock:
+			self.requests['count'] += 1
+			self.requests['seconds'] += seconds
+			self.requests['max_seconds'] = max(self.requests['max_seconds'], seconds)
+			self.requests['bytes_received'] += bytes_received
+			self.requests['bytes_decoded'] += bytes_received if bytes_decoded is None else bytes_decoded
+			if (len(self.slowest_requests) < RunMetrics.SLOWEST_REQUEST_COUNT or
+					seconds > self.slowest_requests[-1]['seconds']):
+				self.slowest_requests.append({ 'url': url, 'seconds': round(seconds, 4), 'bytes_received': bytes_received })
+				self.slowest_requests.sort(key=lambda request: request['seconds'], reverse=True)
+				del self.slowest_requests[RunMetrics.SLOWEST_REQUEST_COUNT:]
+
+	def record(self, stage, seconds, key=None):
+		# Stages are aggregated as count/total/max, both overall and per key (usually the job name), so the summary
+		# stays small however many builds are parsed.
+		with self._lock:
+			stage_totals = self.stages.setdefault(stage, { 'count': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'by_key': {} })
+			totals = [stage_totals]
+			if key is not None:
+				totals.append(stage_totals['by_key'].setdefault(key, { 'count': 0, 'seconds': 0.0, 'max_seconds': 0.0 }))
+			for next_totals in totals:
+				next_totals['count'] += 1
+				next_totals['seconds'] += seconds
+				next_totals['max_seconds'] = max(next_totals['max_seconds'], seconds)
+
+	def record_flaky_tests(self, key, number_of_tests, flaky_tests):
+		# Only the counts and the flakiest few tests per key go into the summary.
+		with self._lock:
+			self.flaky_tests[key] = { 'tests': number_of_tests, 'flaky': len(flaky_tests), 'flakiest': [{ 'case_name': stats.case_name,
+				'flips': stats.flips, 'pass_rate': round(stats.pass_rate(), 4) } for stats in flaky_tests[:RunMetrics.FLAKY_TEST_COUNT]] }
+
+	@contextmanager
+	def timed(self, stage, key=None):
+		start = time.perf_counter()
+		try:
+			yield
+		finally:
+			self.record(stage, time.perf_counter() - start, key)
+
+	def summary(self, cache=None, connection_pool=None):
+		with self._lock:
+			summary = {
+				'started_at': self.started_at,
+				'wall_seconds': round(time.perf_counter() - self._clock_start, 4),
+				'requests': dict(self.requests, slowest=list(self.slowest_requests)),
+				'stages': json.loads(json.dumps(self.stages)),
+				'flaky_tests': json.loads(json.dumps(self.flaky_tests))
+			}
+		if cache:
+			summary['cache'] = { 'hits': cache.hits, 'misses': cache.misses }
+		if connection_pool:
+			summary['connections'] = { 'opened': connection_pool.connections_opened, 'reused': connection_pool.connections_reused,
+				'retries': connection_pool.retries }
+		return summary
+
+	def save(self, filename=None, cache=None, connection_pool=None):
+		filename = filename or RunMetrics.DEFAULT_FILENAME
+		with open(filename, 'w') as file:
+			json.dump(self.summary(cache, connection_pool), file, indent=2)
+		print('Dumped run metrics to \'' + filename + '\'')
@@ -43,6 +43,22 @@ class CommandArgumentsParser:
 				index += 1
 		return argument
 
+	@staticmethod
+	def get_arguments(argument_name, short_name):
+		# Every value of an argument that can be given more than once, in command line order.
+		arguments = []
+		index = 0
+		sys_arguments = sys.argv
+		while index < len(sys_arguments):
+			next_arg = sys_arguments[index]
+			if (next_arg.startswith(CommandArgumentsParser.SHORT_NAME_PREFIX + short_name) or 
+					next_arg.startswith(CommandArgumentsParser.FULL_NAME_PREFIX + argument_name)):
+				argument, index = CommandArgumentsParser._parse_argument(sys_arguments, index)
+				arguments.append(argument)
+			else:
+				index += 1
+		return arguments
+
 	@staticmethod
 	def _parse_argument(sys_arguments, current_index):
 		argument = None